@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
 from pathlib import Path
-from uuid import uuid4
 
 import click
+import requests
+import yaml
 
+from helpers.bundle import BUNDLE_FORMATS, BundleError, read_bundle, write_bundle
 from helpers.jenkins_api import JenkinsAPI
-from helpers.openshift_api import OpenShiftAPI
+from helpers.journal import StepJournal
+from helpers.openshift_api import ENV_RESOURCES, OpenShiftAPI
+from helpers.preflight import run_preflight
+from helpers.promotion import promote_apps
+from helpers.rate_limiter import AdaptiveRateLimiter
+from helpers.schema_validator import TemplateValidationError, check_template
+from helpers.service import ConceptsService, ServiceError
+from helpers.watcher import FileWatcher
 from helpers.concepts import (
+    DEFAULT_MAX_SHARD_BYTES,
     MakeFile,
     OpenShiftTemplate,
     JenkinsMultibranchPipeline,
     JenkinsFile,
+    pipeline_source_id,
 )
 
 
@@ -72,6 +89,41 @@ def group():
     type=str,
     show_default=True,
 )
+@click.option(
+    "--promote-command",
+    help="Promote the images in the Jenkinsfile with the 'promote' command, "
+    "invoked with this command line, instead of with 'oc tag'.",
+    type=str,
+)
+@click.option(
+    "--cache-volume",
+    help="Mount this persistent volume claim in the build pod to keep the "
+    "downloaded dependencies between builds.",
+    type=str,
+)
+@click.option(
+    "--parallel-stages",
+    default=False,
+    help="Test the code and build the image in parallel stages.",
+    type=bool,
+    is_flag=True,
+    show_default=True,
+)
+@click.option(
+    "--oc-pull-policy",
+    default="Always",
+    help="The pull policy of the 'oc' container of the build pod.",
+    type=click.Choice(["Always", "IfNotPresent", "Never"]),
+    show_default=True,
+)
+@click.option(
+    "--test-workers",
+    default=0,
+    help="Run the tests of the Makefile with pytest in this many processes. "
+    "With 0, the test target is left unimplemented.",
+    type=click.IntRange(min=0),
+    show_default=True,
+)
 @click.option(
     "--env-file",
     help="File containing the keys which will be added as separate env vars in the deployment",
@@ -129,6 +181,36 @@ def group():
     type=int,
     show_default=True,
 )
+@click.option(
+    "--max-shard-size",
+    default=DEFAULT_MAX_SHARD_BYTES // 1024,
+    help="Maximum size in KiB of a config map or secret, bigger ones are split.",
+    type=click.IntRange(min=1, max=1000),
+    show_default=True,
+)
+@click.option(
+    "--output-format",
+    default="files",
+    help="Write the concepts as files, or stream them as a bundle to stdout.",
+    type=click.Choice(("files",) + BUNDLE_FORMATS, case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    "--deterministic",
+    default=False,
+    help="Derive the ID of the Jenkins branch source from the namespace and app name, so identical inputs render byte-identical concepts.",
+    type=bool,
+    is_flag=True,
+    show_default=True,
+)
+@click.option(
+    "--watch",
+    default=False,
+    help="Keep running and render the concepts again when a key file or template changes.",
+    type=bool,
+    is_flag=True,
+    show_default=True,
+)
 @click.option(
     "--upload",
     default=False,
@@ -137,6 +219,26 @@ def group():
     is_flag=True,
     show_default=True,
 )
+@click.option(
+    "--resume",
+    default=False,
+    help="Resume a previous upload, skipping the steps found in its journal.",
+    type=bool,
+    is_flag=True,
+    show_default=True,
+)
+@click.option(
+    "--validate/--no-validate",
+    default=True,
+    help="Validate the OpenShift objects against the bundled schemas before uploading.",
+    show_default=True,
+)
+@click.option(
+    "--preflight/--no-preflight",
+    default=True,
+    help="Check the credentials, namespace, Jenkins folder, image stream and quota before uploading.",
+    show_default=True,
+)
 @click.option("--openshift-api-url", envvar="OPENSHIFT_API_URL")
 @click.option("--openshift-api-token", envvar="OPENSHIFT_API_TOKEN")
 @click.option("--jenkins-api-url", envvar="JENKINS_API_URL")
@@ -150,6 +252,11 @@ def create(
     app_type,
     output_folder,
     base_image,
+    promote_command,
+    cache_volume,
+    parallel_stages,
+    oc_pull_policy,
+    test_workers,
     env_file,
     config_map_file,
     secrets_file,
@@ -159,7 +266,14 @@ def create(
     cpu_requested,
     memory_limit,
     cpu_limit,
+    max_shard_size,
+    output_format,
+    deterministic,
+    watch,
     upload,
+    resume,
+    validate,
+    preflight,
     openshift_api_url,
     openshift_api_token,
     jenkins_api_url,
@@ -171,107 +285,339 @@ def create(
     NAMESPACE: The namespace of the app.\n
     APP NAME: The name of the app.
 
+    With an output format other than 'files', nothing is written to disk and
+    all concepts are streamed as a single bundle to stdout.
+
+    With --watch, the concepts are rendered again whenever the key files or
+    the templates change, until interrupted. Only the concepts depending on
+    the changed file are rendered.
+
     """
+    if watch and (upload or output_format != "files"):
+        raise click.UsageError(
+            "--watch can only be used with the 'files' output format, "
+            "and not together with --upload."
+        )
+    if watch and any(
+        f and f.name == "<stdin>" for f in (env_file, config_map_file, secrets_file)
+    ):
+        raise click.UsageError("--watch can not be used with key files read from stdin")
+    bundle = None
+    if output_format != "files":
+        if upload or resume:
+            raise click.UsageError(
+                "--upload and --resume can only be used with the 'files' output "
+                "format, pipe the bundle to the upload command instead."
+            )
+        # Render in memory and stream the bundle to stdout at the end.
+        bundle = {}
+
     # Assemble openshift folder to write to.
     openshift_folder = os.path.join(output_folder, ".openshift")
     # Create openshift subfolder if it not yet exists.
-    Path(openshift_folder).mkdir(parents=True, exist_ok=True)
+    if bundle is None:
+        Path(openshift_folder).mkdir(parents=True, exist_ok=True)
 
     # Create OpenShift template
-    env_vars, cm_keys, secrets = [], [], []
-    if env_file:
-        try:
-            env_vars: list = [
-                env_var.strip().split("=")[0] for env_var in env_file.readlines()
-            ]
-        except Exception as e:
-            raise click.ClickException(f"Error parsing the env file: {e}")
-    if config_map_file:
-        try:
-            cm_keys: list = [
-                cm_key.strip().split("=")[0] for cm_key in config_map_file.readlines()
-            ]
-        except Exception as e:
-            raise click.ClickException(f"Error parsing the config map file: {e}")
-    if secrets_file:
-        try:
-            secrets: list = [
-                secret.strip().split("=")[0] for secret in secrets_file.readlines()
-            ]
-        except Exception as e:
-            raise click.ClickException(f"Error parsing the secrets file: {e}")
-    template_definition = _create_openshift_template(
-        app_name,
-        openshift_folder,
-        **dict(
-            namespace=namespace,
-            app_type=app_type,
-            memory_requested=memory_requested,
-            cpu_requested=cpu_requested,
-            memory_limit=memory_limit,
-            cpu_limit=cpu_limit,
-            env_vars=env_vars,
-            cm_keys=cm_keys,
-            secrets=secrets,
-            replicas=replicas,
-            service_port=service_port,
-        ),
+    template_params = dict(
+        namespace=namespace,
+        app_type=app_type,
+        memory_requested=memory_requested,
+        cpu_requested=cpu_requested,
+        memory_limit=memory_limit,
+        cpu_limit=cpu_limit,
+        max_shard_bytes=max_shard_size * 1024,
+        replicas=replicas,
+        service_port=service_port,
     )
+    key_files = (env_file, config_map_file, secrets_file)
+
+    def render_openshift_template(env_file, config_map_file, secrets_file):
+        return _create_openshift_template(
+            app_name,
+            openshift_folder,
+            bundle,
+            **template_params,
+            **_parse_key_files(env_file, config_map_file, secrets_file),
+        )
+
+    template_definition = render_openshift_template(*key_files)
     # Create Jenkins multibranch pipeline
+    pipeline_params = dict(
+        uuid=pipeline_source_id(namespace, app_name, deterministic),
+        main_branch=main_branch,
+    )
     job_definition = _create_jenkins_multibranch_pipeline(
         app_name,
         openshift_folder,
-        **dict(
-            uuid=str(uuid4()),
-            main_branch=main_branch,
-        ),
+        bundle,
+        **pipeline_params,
     )
     # Create Jenkinsfile with declarative pipeline
+    jenkinsfile_params = dict(
+        namespace=namespace,
+        base_image=base_image,
+        promote_command=promote_command,
+        cache_volume=cache_volume,
+        parallel_stages=parallel_stages,
+        oc_pull_policy=oc_pull_policy,
+    )
     _create_jenkinsfile(
-        app_name, openshift_folder, **dict(namespace=namespace, base_image=base_image)
+        app_name,
+        openshift_folder,
+        bundle,
+        **jenkinsfile_params,
     )
     # Create Makefile
-    _create_makefile(app_name, openshift_folder)
+    makefile_params = dict(test_workers=test_workers)
+    _create_makefile(app_name, openshift_folder, bundle, **makefile_params)
+
+    if watch:
+        renderers = [
+            (
+                OpenShiftTemplate(app_name, openshift_folder),
+                lambda: _render_from_key_files(render_openshift_template, key_files),
+            ),
+            (
+                JenkinsMultibranchPipeline(app_name, openshift_folder),
+                lambda: _create_jenkins_multibranch_pipeline(
+                    app_name, openshift_folder, **pipeline_params
+                ),
+            ),
+            (
+                JenkinsFile(app_name, openshift_folder),
+                lambda: _create_jenkinsfile(
+                    app_name, openshift_folder, **jenkinsfile_params
+                ),
+            ),
+            (
+                MakeFile(app_name, openshift_folder),
+                lambda: _create_makefile(app_name, openshift_folder, **makefile_params),
+            ),
+        ]
+        _watch(renderers, [f.name for f in key_files if f])
+        return
+
+    if bundle is not None:
+        write_bundle(bundle, output_format, sys.stdout.buffer)
 
     if upload:
-        # OpenShift
+        if validate:
+            _validate_template(template_definition, envs)
         openshift_api = OpenShiftAPI(openshift_api_url, openshift_api_token)
+        jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
+        if preflight:
+            _run_preflight(
+                namespace,
+                app_name,
+                envs,
+                template_definition,
+                openshift_api,
+                jenkins_api,
+                resume,
+            )
+        journal = StepJournal(_journal_path(app_name, openshift_folder), resume)
+        # OpenShift
         openshift_api.create_process_template(
-            namespace, app_name, envs, template_definition
+            namespace, app_name, envs, template_definition, journal=journal
         )
         # Jenkins
-        jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
-        jenkins_api.create_multibranch_pipeline(namespace, app_name, job_definition)
+        jenkins_api.create_multibranch_pipeline(
+            namespace, app_name, job_definition, journal=journal
+        )
+        _echo_api_metrics()
+
+
+def _parse_key_file(key_file) -> tuple:
+    """Parse a file with "KEY=value" lines.
 
+    Only the keys end up in the concepts, the size of the values is used to
+    split the config maps and secrets.
 
-def _create_openshift_template(app_name, output_folder, **kwargs) -> str:
+    Returns:
+        The keys and the size in bytes of the value per key.
+    """
+    keys, value_sizes = [], {}
+    for line in key_file.readlines():
+        key, _, value = line.strip().partition("=")
+        keys.append(key)
+        value_sizes[key] = len(value.encode("utf-8"))
+    return keys, value_sizes
+
+
+def _parse_key_files(env_file, config_map_file, secrets_file) -> dict:
+    """Parse the key files into the parameters of the OpenShift template."""
+    params = dict(
+        env_vars=[], cm_keys=[], secrets=[], cm_value_sizes={}, secret_value_sizes={}
+    )
+    if env_file:
+        try:
+            params["env_vars"] = [
+                env_var.strip().split("=")[0] for env_var in env_file.readlines()
+            ]
+        except Exception as e:
+            raise click.ClickException(f"Error parsing the env file: {e}")
+    if config_map_file:
+        try:
+            params["cm_keys"], params["cm_value_sizes"] = _parse_key_file(
+                config_map_file
+            )
+        except Exception as e:
+            raise click.ClickException(f"Error parsing the config map file: {e}")
+    if secrets_file:
+        try:
+            params["secrets"], params["secret_value_sizes"] = _parse_key_file(
+                secrets_file
+            )
+        except Exception as e:
+            raise click.ClickException(f"Error parsing the secrets file: {e}")
+    return params
+
+
+def _render_from_key_files(render, key_files) -> str:
+    """Open the key files again by name and render with them."""
+    with ExitStack() as stack:
+        return render(
+            *(stack.enter_context(open(f.name, "r")) if f else None for f in key_files)
+        )
+
+
+def _watch(renderers, key_files):
+    """Render the concepts again when their template or key files change.
+
+    Args:
+        renderers: The concepts with the function rendering each of them.
+        key_files: The paths of the key files, which the first concept (the
+            OpenShift template) depends on.
+    """
+    key_files = {os.path.abspath(f) for f in key_files}
+    template_files = {
+        os.path.abspath(concept.template_filename()): index
+        for index, (concept, _) in enumerate(renderers)
+    }
+    template_folders = {os.path.dirname(f) for f in template_files}
+    with FileWatcher(key_files, template_folders) as watcher:
+        click.echo(f"Watching for changes ({watcher.backend}), press Ctrl+C to stop")
+        try:
+            while True:
+                changed = watcher.wait()
+                affected = set()
+                for path in changed:
+                    if path in key_files:
+                        affected.add(0)
+                    elif path in template_files:
+                        affected.add(template_files[path])
+                    else:
+                        # Another file in a template folder, e.g. an include.
+                        affected.update(
+                            index
+                            for template_file, index in template_files.items()
+                            if os.path.dirname(template_file) == os.path.dirname(path)
+                        )
+                for index in sorted(affected):
+                    concept, render = renderers[index]
+                    start = time.perf_counter()
+                    try:
+                        render()
+                    except Exception as e:
+                        click.echo(
+                            f"Error rendering {concept.construct_filename()}: {e}"
+                        )
+                        continue
+                    click.echo(
+                        f"Rendered {concept.construct_filename()} in "
+                        f"{(time.perf_counter() - start) * 1000:.1f} ms"
+                    )
+        except KeyboardInterrupt:
+            click.echo("Stopped watching")
+
+
+def _create_openshift_template(app_name, output_folder, bundle=None, **kwargs) -> str:
     template = OpenShiftTemplate(app_name, output_folder)
-    template_yaml = template.create_concept(**kwargs)
-    click.echo(f"Wrote OpenShift template file ({template.construct_filename()})")
-    return template_yaml
+    return _write_concept(template, "OpenShift template file", bundle, **kwargs)
 
 
-def _create_jenkins_multibranch_pipeline(app_name, output_folder, **kwargs) -> str:
+def _create_jenkins_multibranch_pipeline(
+    app_name, output_folder, bundle=None, **kwargs
+) -> str:
     pipeline = JenkinsMultibranchPipeline(app_name, output_folder)
-    pipeline_xml = pipeline.create_concept(**kwargs)
-    click.echo(
-        f"Wrote Jenkins multibranch pipeline file ({pipeline.construct_filename()})"
+    return _write_concept(
+        pipeline, "Jenkins multibranch pipeline file", bundle, **kwargs
     )
-    return pipeline_xml
 
 
-def _create_jenkinsfile(app_name, output_folder, **kwargs) -> str:
+def _create_jenkinsfile(app_name, output_folder, bundle=None, **kwargs) -> str:
     jenkinsfile = JenkinsFile(app_name, output_folder)
-    jenkinsfile_text = jenkinsfile.create_concept(**kwargs)
-    click.echo(f"Wrote Jenkinsfile ({jenkinsfile.construct_filename()})")
-    return jenkinsfile_text
+    return _write_concept(jenkinsfile, "Jenkinsfile", bundle, **kwargs)
 
 
-def _create_makefile(app_name, output_folder, **kwargs) -> str:
+def _create_makefile(app_name, output_folder, bundle=None, **kwargs) -> str:
     makefile = MakeFile(app_name, output_folder)
-    makefile_text = makefile.create_concept(**kwargs)
-    click.echo(f"Wrote Makefile ({makefile.construct_filename()})")
-    return makefile_text
+    return _write_concept(makefile, "Makefile", bundle, **kwargs)
+
+
+def _write_concept(concept, description, bundle=None, **kwargs) -> str:
+    """Render a concept to its file, or into the bundle if one is given.
+
+    When rendering into a bundle, stdout is reserved for the bundle itself so
+    the progress is logged to stderr.
+    """
+    if bundle is None:
+        text = concept.create_concept(**kwargs)
+        click.echo(f"Wrote {description} ({concept.construct_filename()})")
+    else:
+        text = concept.add_to_bundle(bundle, **kwargs)
+        click.echo(f"Rendered {description}", err=True)
+    return text
+
+
+def _load_concept(concept, bundle=None) -> str:
+    """Load a rendered concept from its file, or from the bundle if one is given."""
+    if bundle is None:
+        return concept.load_rendered_concept()
+    return concept.load_from_bundle(bundle)
+
+
+def _validate_template(template_yaml, envs):
+    """Validate the OpenShift template offline, before any object is created."""
+    try:
+        check_template(template_yaml, envs)
+    except TemplateValidationError as e:
+        raise click.ClickException(f"The OpenShift template is invalid:\n{e}")
+    click.echo("OpenShift template validated")
+
+
+def _run_preflight(
+    namespace, app_name, envs, template_yaml, openshift_api, jenkins_api, resume
+):
+    """Check that the upload can succeed, before anything is written."""
+    if openshift_api is None and jenkins_api is None:
+        return
+    run_preflight(
+        namespace,
+        app_name,
+        envs,
+        template_yaml,
+        openshift_api=openshift_api,
+        jenkins_api=jenkins_api,
+        resume=resume,
+    )
+
+
+def _journal_path(app_name, output_folder) -> str:
+    """The journal of an upload is kept next to the concepts."""
+    return os.path.join(output_folder, f"{app_name}-upload-journal.json")
+
+
+def _echo_api_metrics():
+    """Log the concurrency limit and request counters per API server."""
+    for url, limiter in AdaptiveRateLimiter.all_limiters().items():
+        metrics = limiter.metrics()
+        click.echo(
+            f"{url}: limit={metrics['limit']} requests={metrics['requests']} "
+            f"throttled={metrics['throttled']} server_errors={metrics['server_errors']} "
+            f"retries={metrics['retries']} avg_latency={metrics['avg_latency']:.3f}s"
+        )
 
 
 @group.command("upload", short_help="Upload the concepts")
@@ -300,6 +646,26 @@ def _create_makefile(app_name, output_folder, **kwargs) -> str:
     ),
     show_default=True,
 )
+@click.option(
+    "--resume",
+    default=False,
+    help="Resume a previous upload, skipping the steps found in its journal.",
+    type=bool,
+    is_flag=True,
+    show_default=True,
+)
+@click.option(
+    "--validate/--no-validate",
+    default=True,
+    help="Validate the OpenShift objects against the bundled schemas before uploading.",
+    show_default=True,
+)
+@click.option(
+    "--preflight/--no-preflight",
+    default=True,
+    help="Check the credentials, namespace, Jenkins folder, image stream and quota before uploading.",
+    show_default=True,
+)
 @click.option("--openshift-api-url", envvar="OPENSHIFT_API_URL")
 @click.option("--openshift-api-token", envvar="OPENSHIFT_API_TOKEN")
 @click.option("--jenkins-api-url", envvar="JENKINS_API_URL")
@@ -310,6 +676,9 @@ def upload(
     app_name,
     output_folder,
     envs,
+    resume,
+    validate,
+    preflight,
     openshift_api_url,
     openshift_api_token,
     jenkins_api_url,
@@ -320,23 +689,651 @@ def upload(
 
     NAMESPACE: The namespace of the app.\n
     APP NAME: The name of the app.\n
-    FOLDER: The folder where the concepts reside.\n
+    FOLDER: The folder where the concepts reside, or '-' to read a bundle
+    created with 'create --output-format' from stdin.\n
+
+    Every completed step is recorded in a journal in FOLDER. Use --resume to
+    continue an interrupted upload from the first incomplete step.
+
+    The OpenShift objects are validated against the bundled schemas before
+    anything is uploaded, unless --no-validate is given.
+
+    Unless --no-preflight is given, the credentials, the namespace, the
+    Jenkins folder, the image stream and the resource quotas are checked
+    concurrently first, and nothing is uploaded if one of them fails.
 
     """
+    bundle = None
+    journal = None
+    if output_folder == "-":
+        if resume:
+            raise click.UsageError("--resume can not be used when reading from stdin")
+        try:
+            bundle = read_bundle(sys.stdin.buffer)
+        except BundleError as e:
+            raise click.ClickException(str(e))
+    else:
+        journal = StepJournal(_journal_path(app_name, output_folder), resume)
 
-    # OpenShift
     template = OpenShiftTemplate(app_name, output_folder)
-    template_yaml = template.load_rendered_concept()
+    template_yaml = _load_concept(template, bundle)
+    pipeline = JenkinsMultibranchPipeline(app_name, output_folder)
+    pipeline_xml = _load_concept(pipeline, bundle)
+    openshift_api = None
+    jenkins_api = None
     if template_yaml:
+        if validate:
+            _validate_template(template_yaml, envs)
         openshift_api = OpenShiftAPI(openshift_api_url, openshift_api_token)
-        openshift_api.create_process_template(namespace, app_name, envs, template_yaml)
+    if pipeline_xml:
+        jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
+    if preflight:
+        _run_preflight(
+            namespace,
+            app_name,
+            envs,
+            template_yaml,
+            openshift_api,
+            jenkins_api,
+            resume,
+        )
+
+    # OpenShift
+    if template_yaml:
+        openshift_api.create_process_template(
+            namespace, app_name, envs, template_yaml, journal=journal
+        )
 
     # Jenkins
-    pipeline = JenkinsMultibranchPipeline(app_name, output_folder)
-    pipeline_xml = pipeline.load_rendered_concept()
     if pipeline_xml:
-        jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
-        jenkins_api.create_multibranch_pipeline(namespace, app_name, pipeline_xml)
+        jenkins_api.create_multibranch_pipeline(
+            namespace, app_name, pipeline_xml, journal=journal
+        )
+
+    _echo_api_metrics()
+
+
+@group.command("sync-jenkins", short_help="Sync the Jenkins jobs of a folder")
+@click.argument("namespace")
+@click.argument(
+    "output_folders",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    "--max-workers",
+    default=8,
+    help="The maximum amount of jobs created or updated at the same time.",
+    type=click.IntRange(min=1),
+    show_default=True,
+)
+@click.option("--jenkins-api-url", envvar="JENKINS_API_URL")
+@click.option("--jenkins-api-user", envvar="JENKINS_API_USER")
+@click.option("--jenkins-api-token", envvar="JENKINS_API_TOKEN")
+def sync_jenkins(
+    namespace,
+    output_folders,
+    max_workers,
+    jenkins_api_url,
+    jenkins_api_user,
+    jenkins_api_token,
+):
+    """Sync the multibranch pipelines of a Jenkins folder
+
+    NAMESPACE: The namespace, which is also the name of the Jenkins folder.\n
+    OUTPUT FOLDERS: The folders with the rendered multibranch pipelines.
+
+    The jobs of the folder are listed with a single request. Only the jobs
+    which are missing or differ from the rendered pipeline are created or
+    updated.
+
+    """
+    pipelines = {}
+    for output_folder in output_folders:
+        for pipeline in JenkinsMultibranchPipeline.find_rendered(output_folder):
+            pipeline_xml = pipeline.load_rendered_concept()
+            if pipeline_xml:
+                pipelines[pipeline.app_name] = pipeline_xml
+    if not pipelines:
+        raise click.ClickException("No rendered multibranch pipelines found")
+
+    jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
+    try:
+        actions = jenkins_api.sync_folder(namespace, pipelines, max_workers)
+    except requests.RequestException as e:
+        raise click.ClickException(f"Error listing the jobs of '{namespace}': {e}")
+    failures = 0
+    for app_name, action in actions.items():
+        click.echo(f"Jenkins job '{namespace}/{app_name}' {action}")
+        failures += action.startswith("failed")
+
+    _echo_api_metrics()
+    if failures:
+        raise click.ClickException(f"{failures} of {len(actions)} jobs failed to sync")
+
+
+@group.command("delete", short_help="Delete the objects and job of apps")
+@click.argument("namespace", required=False)
+@click.argument("app_name", required=False)
+@click.option(
+    "--envs",
+    multiple=True,
+    help="Only delete the objects of these environments. The template and the "
+    "Jenkins job are kept.",
+    type=click.Choice(
+        [
+            "int",
+            "qas",
+            "prd",
+        ],
+        case_sensitive=False,
+    ),
+)
+@click.option(
+    "--manifest",
+    help="YAML file with the apps to delete: a list of mappings with "
+    "'namespace', 'app_name' and optionally 'envs'.",
+    type=click.File("r"),
+)
+@click.option(
+    "--max-workers",
+    default=8,
+    help="The maximum amount of delete requests sent at the same time.",
+    type=click.IntRange(min=1),
+    show_default=True,
+)
+@click.option(
+    "--yes",
+    default=False,
+    help="Do not ask for confirmation.",
+    type=bool,
+    is_flag=True,
+)
+@click.option("--openshift-api-url", envvar="OPENSHIFT_API_URL")
+@click.option("--openshift-api-token", envvar="OPENSHIFT_API_TOKEN")
+@click.option("--jenkins-api-url", envvar="JENKINS_API_URL")
+@click.option("--jenkins-api-user", envvar="JENKINS_API_USER")
+@click.option("--jenkins-api-token", envvar="JENKINS_API_TOKEN")
+def delete(
+    namespace,
+    app_name,
+    envs,
+    manifest,
+    max_workers,
+    yes,
+    openshift_api_url,
+    openshift_api_token,
+    jenkins_api_url,
+    jenkins_api_user,
+    jenkins_api_token,
+):
+    """Delete the OpenShift objects and the Jenkins job of apps
+
+    NAMESPACE: The namespace of the app.\n
+    APP NAME: The name of the app.
+
+    The services, deployments, config maps and secrets are deleted with one
+    request per kind, selected by their 'app' (and 'env') label. The template
+    and the Jenkins multibranch job are deleted at the same time. Use
+    --manifest instead of NAMESPACE and APP NAME to tear down many apps.
+
+    """
+    if manifest:
+        if namespace or app_name:
+            raise click.UsageError("Give either NAMESPACE and APP NAME, or --manifest")
+        apps = _parse_manifest(manifest)
+    elif namespace and app_name:
+        apps = [dict(namespace=namespace, app_name=app_name, envs=list(envs))]
+    else:
+        raise click.UsageError("Missing NAMESPACE and APP NAME, or --manifest")
+
+    for app in apps:
+        scope = f"envs {', '.join(app['envs'])}" if app["envs"] else "all envs"
+        click.echo(f"{app['namespace']}/{app['app_name']} ({scope})")
+    if not yes:
+        click.confirm(f"Delete {len(apps)} app(s)?", abort=True)
+
+    openshift_api = OpenShiftAPI(openshift_api_url, openshift_api_token)
+    jenkins_api = JenkinsAPI(jenkins_api_url, jenkins_api_user, jenkins_api_token)
+    tasks = []
+    for app in apps:
+        project, name = app["namespace"], app["app_name"]
+        selector = OpenShiftAPI.label_selector(name, app["envs"])
+        for kind in ENV_RESOURCES:
+            tasks.append((openshift_api.delete_collection, (project, kind, selector)))
+        # The template and the job are shared by all envs.
+        if not app["envs"]:
+            tasks.append((openshift_api.delete_template, (project, name)))
+            tasks.append((jenkins_api.delete_multibranch_pipeline, (project, name)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(task, *args) for task, args in tasks]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    for error in errors:
+        click.echo(f"Error: {error}", err=True)
+
+    _echo_api_metrics()
+    if errors:
+        raise click.ClickException(f"{len(errors)} of {len(tasks)} deletions failed")
+
+
+def _parse_manifest(manifest) -> list:
+    """Parse the manifest of the apps to delete."""
+    try:
+        entries = yaml.safe_load(manifest)
+    except yaml.YAMLError as e:
+        raise click.ClickException(f"Error parsing the manifest: {e}")
+    if not isinstance(entries, list):
+        raise click.ClickException("Error parsing the manifest: expected a list")
+    apps = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not all(
+            entry.get(key) for key in ("namespace", "app_name")
+        ):
+            raise click.ClickException(
+                f"Error parsing the manifest: 'namespace' and 'app_name' expected, got {entry}"
+            )
+        envs = entry.get("envs") or []
+        unknown = set(envs) - {"int", "qas", "prd"}
+        if unknown:
+            raise click.ClickException(
+                f"Error parsing the manifest: unknown envs {sorted(unknown)}"
+            )
+        apps.append(
+            dict(namespace=entry["namespace"], app_name=entry["app_name"], envs=envs)
+        )
+    return apps
+
+
+@group.command("promote", short_help="Promote the images of apps to an env")
+@click.argument("namespace")
+@click.argument(
+    "env",
+    type=click.Choice(
+        [
+            "int",
+            "qas",
+            "prd",
+        ],
+        case_sensitive=False,
+    ),
+)
+@click.argument("apps", nargs=-1, required=True)
+@click.option(
+    "--max-workers",
+    default=8,
+    help="The maximum amount of images promoted at the same time.",
+    type=click.IntRange(min=1),
+    show_default=True,
+)
+@click.option(
+    "--timeout",
+    default=600,
+    help="How long to wait for the rollouts, in seconds.",
+    type=click.IntRange(min=1),
+    show_default=True,
+)
+@click.option(
+    "--wait/--no-wait",
+    default=True,
+    help="Wait until the deployments are rolled out.",
+    show_default=True,
+)
+@click.option("--openshift-api-url", envvar="OPENSHIFT_API_URL")
+@click.option("--openshift-api-token", envvar="OPENSHIFT_API_TOKEN")
+def promote(
+    namespace,
+    env,
+    apps,
+    max_workers,
+    timeout,
+    wait,
+    openshift_api_url,
+    openshift_api_token,
+):
+    """Promote the images of apps to an environment
+
+    NAMESPACE: The namespace of the apps.\n
+    ENV: The environment to promote to.\n
+    APPS: The apps and the tag of the image to promote, as APP_NAME:TAG.
+
+    The tag ENV of the image stream of every app is pointed to the image of
+    TAG, like "oc tag", and the rollouts of the deployments are followed over
+    a single watch.
+
+    """
+    tags = {}
+    for app in apps:
+        app_name, _, tag = app.partition(":")
+        if not app_name or not tag:
+            raise click.BadParameter(f"'{app}' is not APP_NAME:TAG", param_hint="APPS")
+        tags[app_name] = tag
+
+    openshift_api = OpenShiftAPI(openshift_api_url, openshift_api_token)
+    results = promote_apps(
+        openshift_api,
+        namespace,
+        env,
+        tags,
+        max_workers=max_workers,
+        timeout=timeout,
+        wait=wait,
+    )
+    failures = 0
+    for app_name, result in results.items():
+        click.echo(f"{app_name}: {result}")
+        failures += result.startswith("failed")
+
+    _echo_api_metrics()
+    if failures:
+        raise click.ClickException(f"{failures} of {len(results)} promotions failed")
+
+
+# The options of 'create' which can be given in the payload of a request.
+SERVICE_OPTIONS = (
+    "main_branch",
+    "envs",
+    "app_type",
+    "base_image",
+    "promote_command",
+    "cache_volume",
+    "parallel_stages",
+    "oc_pull_policy",
+    "test_workers",
+    "replicas",
+    "service_port",
+    "memory_requested",
+    "cpu_requested",
+    "memory_limit",
+    "cpu_limit",
+    "max_shard_size",
+    "deterministic",
+    "resume",
+    "validate",
+    "preflight",
+)
+# The key files, which are given by their content in the payload of a request.
+SERVICE_KEY_FILES = ("env_file", "config_map_file", "secrets_file")
+
+
+@group.command("serve", short_help="Serve create/upload over HTTP")
+@click.option("--host", default="127.0.0.1", help="The host to listen on.")
+@click.option("--port", default=8000, help="The port to listen on.", type=int)
+@click.option(
+    "--workspace",
+    default=".",
+    help="The folder under which the output folders of the requests reside.",
+    type=click.Path(exists=True, file_okay=False),
+    show_default=True,
+)
+@click.option("--openshift-api-url", envvar="OPENSHIFT_API_URL")
+@click.option("--openshift-api-token", envvar="OPENSHIFT_API_TOKEN")
+@click.option("--jenkins-api-url", envvar="JENKINS_API_URL")
+@click.option("--jenkins-api-user", envvar="JENKINS_API_USER")
+@click.option("--jenkins-api-token", envvar="JENKINS_API_TOKEN")
+def serve(
+    host,
+    port,
+    workspace,
+    openshift_api_url,
+    openshift_api_token,
+    jenkins_api_url,
+    jenkins_api_user,
+    jenkins_api_token,
+):
+    """Run a local HTTP service to render, create and upload concepts
+
+    The service keeps the compiled templates and the sessions to OpenShift and
+    Jenkins warm between requests, and handles requests concurrently.
+
+    \b
+    POST /render   Render the concepts, returned as {"concepts": {...}}.
+    POST /create   Render the concepts into "output_folder", and upload them
+                   if "upload" is true.
+    POST /upload   Upload the "concepts" of a rendered bundle, or the ones
+                   in "output_folder".
+    GET /metrics   Request counts and latencies per endpoint.
+
+    The payload is a JSON object with "namespace", "app_name" and optionally
+    the options of 'create'. The key files are given by their content.
+
+    The "output_folder" of a request is relative to WORKSPACE, folders outside
+    of it are refused.
+
+    """
+    credentials = dict(
+        openshift_api_url=openshift_api_url,
+        openshift_api_token=openshift_api_token,
+        jenkins_api_url=jenkins_api_url,
+        jenkins_api_user=jenkins_api_user,
+        jenkins_api_token=jenkins_api_token,
+    )
+    service = ConceptsService((host, port), _service_routes(credentials, workspace))
+    click.echo(f"Serving on http://{host}:{service.server_port}, press Ctrl+C to stop")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("Stopped serving")
+    finally:
+        service.server_close()
+
+
+def _service_routes(credentials: dict, workspace: str = ".") -> dict:
+    """The handlers of the service, uploading with the given credentials.
+
+    The output folders of the requests are resolved under the workspace.
+    """
+
+    def render(payload):
+        params = _service_params(payload)
+        bundle = {}
+        _render_service_concepts(params, ".", bundle)
+        return {"concepts": bundle}
+
+    def create(payload):
+        params = _service_params(payload)
+        if not payload.get("output_folder"):
+            raise ServiceError("Missing 'output_folder'")
+        output_folder = _workspace_path(workspace, payload["output_folder"])
+        openshift_folder = os.path.join(output_folder, ".openshift")
+        Path(openshift_folder).mkdir(parents=True, exist_ok=True)
+        template_yaml, pipeline_xml = _render_service_concepts(params, openshift_folder)
+        if payload.get("upload"):
+            journal = StepJournal(
+                _journal_path(params["app_name"], openshift_folder),
+                params["resume"],
+            )
+            _upload_service_concepts(
+                params, credentials, template_yaml, pipeline_xml, journal
+            )
+        return {
+            "output_folder": openshift_folder,
+            "uploaded": bool(payload.get("upload")),
+        }
+
+    def upload(payload):
+        params = _service_params(payload)
+        app_name = params["app_name"]
+        journal = None
+        if "concepts" in payload:
+            bundle = payload["concepts"]
+            template_yaml = OpenShiftTemplate(app_name).load_from_bundle(bundle)
+            pipeline_xml = JenkinsMultibranchPipeline(app_name).load_from_bundle(bundle)
+        elif payload.get("output_folder"):
+            output_folder = _workspace_path(workspace, payload["output_folder"])
+            journal = StepJournal(
+                _journal_path(app_name, output_folder), params["resume"]
+            )
+            template_yaml = OpenShiftTemplate(
+                app_name, output_folder
+            ).load_rendered_concept()
+            pipeline_xml = JenkinsMultibranchPipeline(
+                app_name, output_folder
+            ).load_rendered_concept()
+        else:
+            raise ServiceError("Missing 'concepts' or 'output_folder'")
+        _upload_service_concepts(
+            params, credentials, template_yaml, pipeline_xml, journal
+        )
+        return {"uploaded": True}
+
+    return {
+        ("POST", "/render"): render,
+        ("POST", "/create"): create,
+        ("POST", "/upload"): upload,
+    }
+
+
+def _workspace_path(workspace: str, output_folder) -> str:
+    """Resolve the output folder of a request under the workspace.
+
+    Raises:
+        ServiceError: The output folder is not a path inside the workspace.
+    """
+    if not isinstance(output_folder, str):
+        raise ServiceError("Invalid 'output_folder': a path expected")
+    root = os.path.realpath(workspace)
+    path = os.path.realpath(os.path.join(root, output_folder))
+    if os.path.commonpath([root, path]) != root:
+        raise ServiceError(
+            f"Invalid 'output_folder': '{output_folder}' is outside the workspace"
+        )
+    return path
+
+
+def _service_params(payload: dict) -> dict:
+    """Validate the payload of a request and fill in the defaults of 'create'."""
+    params = {}
+    for name in ("namespace", "app_name"):
+        if not isinstance(payload.get(name), str) or not payload[name]:
+            raise ServiceError(f"Missing '{name}'")
+        params[name] = payload[name]
+    options = {param.name: param for param in create.params}
+    for name in SERVICE_OPTIONS:
+        param = options[name]
+        value = payload.get(name)
+        if value is None:
+            value = param.default
+        if value is None:
+            # Converting None would turn it into the string "None".
+            params[name] = None
+            continue
+        try:
+            if param.multiple:
+                value = tuple(param.type.convert(v, param, None) for v in value)
+            else:
+                value = param.type.convert(value, param, None)
+        except (click.BadParameter, TypeError) as e:
+            raise ServiceError(f"Invalid '{name}': {e}")
+        params[name] = value
+    for name in SERVICE_KEY_FILES:
+        content = payload.get(name)
+        if content is not None and not isinstance(content, str):
+            raise ServiceError(f"Invalid '{name}': the content of the file expected")
+        params[name] = content
+    return params
+
+
+def _render_service_concepts(params: dict, output_folder: str, bundle=None) -> tuple:
+    """Render the concepts of a request into files, or into the bundle.
+
+    Returns:
+        The OpenShift template and the multibranch pipeline.
+    """
+    app_name = params["app_name"]
+    key_files = (
+        io.StringIO(params[name]) if params[name] else None
+        for name in SERVICE_KEY_FILES
+    )
+    template_yaml = _create_openshift_template(
+        app_name,
+        output_folder,
+        bundle,
+        namespace=params["namespace"],
+        app_type=params["app_type"],
+        memory_requested=params["memory_requested"],
+        cpu_requested=params["cpu_requested"],
+        memory_limit=params["memory_limit"],
+        cpu_limit=params["cpu_limit"],
+        max_shard_bytes=params["max_shard_size"] * 1024,
+        replicas=params["replicas"],
+        service_port=params["service_port"],
+        **_parse_key_files(*key_files),
+    )
+    pipeline_xml = _create_jenkins_multibranch_pipeline(
+        app_name,
+        output_folder,
+        bundle,
+        uuid=pipeline_source_id(params["namespace"], app_name, params["deterministic"]),
+        main_branch=params["main_branch"],
+    )
+    _create_jenkinsfile(
+        app_name,
+        output_folder,
+        bundle,
+        namespace=params["namespace"],
+        base_image=params["base_image"],
+        promote_command=params["promote_command"],
+        cache_volume=params["cache_volume"],
+        parallel_stages=params["parallel_stages"],
+        oc_pull_policy=params["oc_pull_policy"],
+    )
+    _create_makefile(
+        app_name, output_folder, bundle, test_workers=params["test_workers"]
+    )
+    return template_yaml, pipeline_xml
+
+
+def _upload_service_concepts(
+    params: dict, credentials: dict, template_yaml, pipeline_xml, journal
+):
+    """Upload the concepts of a request with the pooled API clients."""
+    namespace, app_name, envs = params["namespace"], params["app_name"], params["envs"]
+    openshift_api = None
+    jenkins_api = None
+    if template_yaml:
+        if params["validate"]:
+            _validate_template(template_yaml, envs)
+        openshift_api = _pooled_openshift_api(
+            credentials["openshift_api_url"], credentials["openshift_api_token"]
+        )
+    if pipeline_xml:
+        jenkins_api = _pooled_jenkins_api(
+            credentials["jenkins_api_url"],
+            credentials["jenkins_api_user"],
+            credentials["jenkins_api_token"],
+        )
+    if params["preflight"]:
+        _run_preflight(
+            namespace,
+            app_name,
+            envs,
+            template_yaml,
+            openshift_api,
+            jenkins_api,
+            params["resume"],
+        )
+    if template_yaml:
+        openshift_api.create_process_template(
+            namespace, app_name, envs, template_yaml, journal=journal
+        )
+    if pipeline_xml:
+        jenkins_api.create_multibranch_pipeline(
+            namespace, app_name, pipeline_xml, journal=journal
+        )
+
+
+@lru_cache(maxsize=None)
+def _pooled_openshift_api(url: str, token: str) -> OpenShiftAPI:
+    """An OpenShift client, of which the session is reused between requests."""
+    return OpenShiftAPI(url, token)
+
+
+@lru_cache(maxsize=None)
+def _pooled_jenkins_api(url: str, user: str, token: str) -> JenkinsAPI:
+    """A Jenkins client, of which the session is reused between requests."""
+    return JenkinsAPI(url, user, token)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import posixpath
+import tarfile
+import zipfile
+from typing import BinaryIO, Dict
+
+BUNDLE_FORMATS = ("tar", "zip", "json")
+
+# The folder the concepts are placed in, so that extracting an archive in the
+# root of a project results in the same layout as writing the files.
+BUNDLE_FOLDER = ".openshift"
+
+# Fixed timestamp of the archive members so that identical concepts result in
+# an identical archive.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class BundleError(Exception):
+    """The bundle could not be read."""
+
+
+def write_bundle(concepts: Dict[str, str], bundle_format: str, stream: BinaryIO):
+    """Write rendered concepts as a single bundle to a (non-seekable) stream.
+
+    Args:
+        concepts: The rendered concepts by their basename.
+        bundle_format: One of "tar", "zip" or "json".
+        stream: The binary stream to write to, e.g. stdout.
+    """
+    if bundle_format == "json":
+        stream.write(
+            json.dumps({"concepts": concepts}, indent=2, sort_keys=True).encode("utf-8")
+        )
+    elif bundle_format == "tar":
+        with tarfile.open(fileobj=stream, mode="w|") as tar:
+            for basename in sorted(concepts):
+                data = concepts[basename].encode("utf-8")
+                info = tarfile.TarInfo(posixpath.join(BUNDLE_FOLDER, basename))
+                info.size = len(data)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+    elif bundle_format == "zip":
+        with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
+            for basename in sorted(concepts):
+                info = zipfile.ZipInfo(
+                    posixpath.join(BUNDLE_FOLDER, basename), date_time=ZIP_DATE_TIME
+                )
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                z.writestr(info, concepts[basename])
+    else:
+        raise ValueError(f"Unknown bundle format: {bundle_format}")
+    stream.flush()
+
+
+def read_bundle(stream: BinaryIO) -> Dict[str, str]:
+    """Read a bundle written by `write_bundle`.
+
+    The format is detected from the content.
+
+    Args:
+        stream: The binary stream to read from, e.g. stdin.
+
+    Returns:
+        The concepts by their basename.
+
+    Raises:
+        BundleError: If the content is not a valid bundle.
+    """
+    data = stream.read()
+    try:
+        if data.startswith(b"PK\x03\x04"):
+            with zipfile.ZipFile(io.BytesIO(data)) as z:
+                return {
+                    posixpath.basename(name): z.read(name).decode("utf-8")
+                    for name in z.namelist()
+                    if not name.endswith("/")
+                }
+        if data.lstrip().startswith(b"{"):
+            return json.loads(data)["concepts"]
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tar:
+            return {
+                posixpath.basename(member.name): tar.extractfile(member)
+                .read()
+                .decode("utf-8")
+                for member in tar.getmembers()
+                if member.isfile()
+            }
+    except (zipfile.BadZipFile, tarfile.TarError, ValueError, KeyError) as e:
+        raise BundleError(f"Error reading the bundle: {e}")
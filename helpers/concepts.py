@@ -1,13 +1,82 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import glob
 import os
 from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List
+from uuid import NAMESPACE_URL, uuid4, uuid5
 
 import click
 
 from helpers.jinja_template import JinjaTemplate
 
+# Kubernetes objects are capped at 1 MiB. Keep the config maps and secrets well
+# below that, as every pod mounting them and every watch on them pays for it.
+DEFAULT_MAX_SHARD_BYTES = 512 * 1024
+
+# Estimated size of the serialization of a key and the value of an entry.
+ENTRY_OVERHEAD_BYTES = 8
+
+
+def shard_keys(
+    keys: Iterable[str],
+    value_sizes: Dict[str, int] = None,
+    max_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+) -> List[List[str]]:
+    """Split the keys of a config map or secret into size-bounded shards.
+
+    The keys are packed in order, so the same keys and sizes always result in
+    the same shards. A key that is too big on its own gets a shard of its own.
+
+    Args:
+        keys: The keys.
+        value_sizes: The size in bytes of the value per key. Unknown values
+            are counted as empty.
+        max_bytes: The maximum size of the data of a shard.
+
+    Returns:
+        The keys per shard.
+    """
+    value_sizes = value_sizes or {}
+    shards, shard, shard_bytes = [], [], 0
+    for key in keys:
+        entry_bytes = (
+            len(key.encode("utf-8")) + value_sizes.get(key, 0) + ENTRY_OVERHEAD_BYTES
+        )
+        if shard and shard_bytes + entry_bytes > max_bytes:
+            shards.append(shard)
+            shard, shard_bytes = [], 0
+        shard.append(key)
+        shard_bytes += entry_bytes
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def pipeline_source_id(
+    namespace: str, app_name: str, deterministic: bool = False
+) -> str:
+    """The ID of the branch source of a multibranch pipeline.
+
+    Args:
+        namespace: The namespace of the app.
+        app_name: The name of the app.
+        deterministic: Derive the ID from the namespace and app name, so that it
+            is the same on every render, instead of a random one.
+
+    Returns:
+        The ID as a UUID string.
+    """
+    if deterministic:
+        return str(uuid5(NAMESPACE_URL, f"jenkins:job/{namespace}/job/{app_name}"))
+    return str(uuid4())
+
+
+def shard_suffix(index: int) -> str:
+    """The suffix of the name of a shard, the first shard has none."""
+    return f"-{index + 1}" if index else ""
+
 
 class Concept(ABC):
     """Creates a serialized file of a concept.
@@ -33,11 +102,15 @@ class Concept(ABC):
         Returns:
             The rendered template.
         """
-        jinja = JinjaTemplate(self._template_path())
+        jinja = JinjaTemplate.for_folder(self._template_path())
         return jinja.render_template(
             self._template_basename(), app_name=self.app_name, **kwargs
         )
 
+    def template_filename(self) -> str:
+        """The path to the Jinja2 template file the concept is rendered from."""
+        return os.path.join(self._template_path(), self._template_basename())
+
     def construct_filename(self) -> str:
         """The filename to write to concept to."""
         return os.path.join(self.output_folder, self._output_basename())
@@ -54,6 +127,33 @@ class Concept(ABC):
             f.writelines(concept)
         return concept
 
+    def add_to_bundle(self, bundle: Dict[str, str], **kwargs) -> str:
+        """Render the concept into an in-memory bundle instead of a file.
+
+        Args:
+            bundle: The rendered concepts by their basename.
+            **kwargs: The parameters to render the template with.
+        Returns:
+            The rendered template."""
+        concept = self.render_template(**kwargs)
+        bundle[self._output_basename()] = concept
+        return concept
+
+    def load_from_bundle(self, bundle: Dict[str, str]) -> str:
+        """Load in a previously rendered template from an in-memory bundle.
+
+        Args:
+            bundle: The rendered concepts by their basename.
+
+        Returns:
+            The contents of the concept or None if it is not in the bundle.
+        """
+        try:
+            return bundle[self._output_basename()]
+        except KeyError:
+            click.echo(f'Concept "{self._output_basename()}" not found in bundle')
+            return None
+
     def load_rendered_concept(self) -> str:
         """Load in a previously rendered template.
 
@@ -101,9 +201,63 @@ class JenkinsMultibranchPipeline(Concept):
     def _output_basename(self) -> str:
         return f"{self.app_name}-{self._template_basename()}"
 
+    @classmethod
+    def find_rendered(cls, output_folder: str) -> List["JenkinsMultibranchPipeline"]:
+        """Find the rendered multibranch pipelines in a folder.
+
+        Args:
+            output_folder: The folder with the rendered concepts.
+
+        Returns:
+            A concept per rendered file, with the app name taken from the filename.
+        """
+        suffix = "-multibranch-pipeline.xml"
+        filenames = glob.glob(os.path.join(glob.escape(output_folder), f"*{suffix}"))
+        return [
+            cls(os.path.basename(filename)[: -len(suffix)], output_folder)
+            for filename in sorted(filenames)
+        ]
+
 
 class OpenShiftTemplate(Concept):
-    """Create an OpenShift template file in the YAML format."""
+    """Create an OpenShift template file in the YAML format.
+
+    The config map keys and secrets are split over as many config maps and
+    secrets as needed to keep each of them below the maximum shard size. The
+    first one is named "<app_name>-<env>", the next ones get the suffix "-2",
+    "-3", and so on.
+    """
+
+    def render_template(
+        self,
+        cm_keys: List[str] = (),
+        secrets: List[str] = (),
+        cm_value_sizes: Dict[str, int] = None,
+        secret_value_sizes: Dict[str, int] = None,
+        max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+        **kwargs,
+    ) -> str:
+        """Loads in the jinja2 template and renders it.
+
+        Args:
+            cm_keys: The keys of the config map.
+            secrets: The keys of the secret.
+            cm_value_sizes: The size in bytes of the value per config map key.
+            secret_value_sizes: The size in bytes of the value per secret.
+            max_shard_bytes: The maximum size of the data of a config map or secret.
+            kwargs: The other key-values to render the template with.
+
+        Returns:
+            The rendered template.
+        """
+        return super().render_template(
+            cm_keys=cm_keys,
+            secrets=secrets,
+            cm_shards=shard_keys(cm_keys, cm_value_sizes, max_shard_bytes),
+            secret_shards=shard_keys(secrets, secret_value_sizes, max_shard_bytes),
+            shard_suffix=shard_suffix,
+            **kwargs,
+        )
 
     def _template_path(self) -> str:
         return os.path.join(os.getcwd(), "templates", "openshift")
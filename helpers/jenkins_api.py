@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import click
 import requests
 
+from helpers.journal import StepJournal
+from helpers.rate_limiter import AdaptiveRateLimiter
+
+# The XPath of the ID of the branch source of a multibranch pipeline. Jenkins
+# keeps the ID it was created with, so it is ignored when comparing jobs.
+SOURCE_ID_PATH = "./sources/data/jenkins.branch.BranchSource/source/id"
+
 
 class JenkinsAPI:
     """Communicates with Jenkins via the REST API."""
@@ -12,9 +23,26 @@ class JenkinsAPI:
         self.url = url
         self.user = api_user
         self.token = api_token
+        self.session = requests.Session()
+        self.session.auth = (self.user, self.token)
+        self.session.verify = False
+        self.limiter = AdaptiveRateLimiter.for_url(url)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request to Jenkins through the rate limiter.
+
+        Args:
+            method: The HTTP method.
+            path: The path of the resource, relative to the Jenkins URL.
+            **kwargs: Passed to `requests.Session.request`.
+
+        Returns:
+            The response.
+        """
+        return self.limiter.send(self.session, method, f"{self.url}{path}", **kwargs)
 
     def create_multibranch_pipeline(
-        self, folder: str, app_name: str, data: bytes
+        self, folder: str, app_name: str, data: bytes, journal: StepJournal = None
     ) -> bool:
         """Create the multibranch job in Jenkins.
 
@@ -22,22 +50,31 @@ class JenkinsAPI:
             folder: The folder of the multibranch pipeline.
             app_name: The name of the application.
             data: The template.
+            journal: The journal of the upload. If the job is already in it, it
+                will not be created again.
 
         Returns:
             True if successful.
         """
+        step = f"JenkinsJob/{folder}/{app_name}"
+        if journal is not None and journal.is_done(step, data):
+            click.echo(
+                "Jenkins multibranch pipeline created (skipped, found in journal)"
+            )
+            return True
         headers = {"Content-Type": "application/xml"}
         query_params = {"name": app_name}
-        response = requests.post(
-            f"{self.url}/job/{folder}/createItem",
-            auth=(self.user, self.token),
+        response = self._request(
+            "POST",
+            f"/job/{folder}/createItem",
             headers=headers,
             params=query_params,
             data=data,
-            verify=False,
         )
         response.raise_for_status()
         click.echo("Jenkins multibranch pipeline created")
+        if journal is not None:
+            journal.record(step, data)
         return response.status_code == 200
 
     def get_multibranch_pipeline(self, folder: str, app_name: str) -> str:
@@ -50,9 +87,136 @@ class JenkinsAPI:
         Returns:
             The multibranch pipeline in XML format.
         """
-        response = requests.get(
-            f"{self.url}/job/{folder}/job/{app_name}/config.xml",
-            auth=(self.user, self.token),
-            verify=False,
-        )
+        response = self._request("GET", f"/job/{folder}/job/{app_name}/config.xml")
+        response.raise_for_status()
         return response.text
+
+    def update_multibranch_pipeline(self, folder: str, app_name: str, data: bytes):
+        """Replace the configuration of an existing multibranch job in Jenkins.
+
+        Args:
+            folder: The folder of the multibranch pipeline.
+            app_name: The name of the application.
+            data: The template.
+        """
+        headers = {"Content-Type": "application/xml"}
+        response = self._request(
+            "POST",
+            f"/job/{folder}/job/{app_name}/config.xml",
+            headers=headers,
+            data=data,
+        )
+        response.raise_for_status()
+
+    def delete_multibranch_pipeline(self, folder: str, app_name: str):
+        """Delete the multibranch job in Jenkins, if it exists.
+
+        Args:
+            folder: The folder of the multibranch pipeline.
+            app_name: The name of the application.
+        """
+        response = self._request("POST", f"/job/{folder}/job/{app_name}/doDelete")
+        if response.status_code == 404:
+            click.echo(f"Jenkins multibranch pipeline '{folder}/{app_name}' not found")
+            return
+        response.raise_for_status()
+        click.echo(f"Jenkins multibranch pipeline '{folder}/{app_name}' deleted")
+
+    def get_folder(self, folder: str) -> Optional[dict]:
+        """Get the name of a folder, which fails if the credentials are invalid.
+
+        Args:
+            folder: The folder in Jenkins.
+
+        Returns:
+            The folder or None if it does not exist.
+        """
+        response = self._request(
+            "GET", f"/job/{folder}/api/json", params={"tree": "name"}
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def list_jobs(self, folder: str) -> List[str]:
+        """List the names of the jobs in a folder with a single request.
+
+        Args:
+            folder: The folder in Jenkins.
+
+        Returns:
+            The names of the jobs.
+        """
+        response = self._request(
+            "GET", f"/job/{folder}/api/json", params={"tree": "jobs[name]"}
+        )
+        response.raise_for_status()
+        return [job["name"] for job in response.json().get("jobs", [])]
+
+    def sync_folder(
+        self, folder: str, pipelines: Dict[str, str], max_workers: int = 8
+    ) -> Dict[str, str]:
+        """Create or update the multibranch jobs of a folder.
+
+        The jobs of the folder are listed with one request. Missing jobs are
+        created, while the configuration of the existing ones is fetched and
+        only sent again if it differs from the local one. Jobs are handled
+        concurrently, bounded by `max_workers` and the rate limiter.
+
+        Args:
+            folder: The folder of the multibranch pipelines.
+            pipelines: The multibranch pipelines in XML format by app name.
+            max_workers: The maximum amount of jobs handled at the same time.
+
+        A job which fails does not stop the others, its action is the reason
+        it failed instead.
+
+        Returns:
+            The action taken per app name: "created", "updated", "unchanged" or
+            "failed: <reason>".
+
+        Raises:
+            requests.HTTPError: The jobs of the folder could not be listed.
+        """
+        existing = set(self.list_jobs(folder))
+
+        def sync(app_name: str) -> str:
+            data = pipelines[app_name]
+            try:
+                if app_name not in existing:
+                    self.create_multibranch_pipeline(folder, app_name, data)
+                    return "created"
+                remote = self.get_multibranch_pipeline(folder, app_name)
+                if _normalize_job_xml(remote) == _normalize_job_xml(data):
+                    return "unchanged"
+                self.update_multibranch_pipeline(folder, app_name, data)
+                return "updated"
+            except requests.RequestException as e:
+                return f"failed: {e}"
+
+        app_names = sorted(pipelines)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(app_names, executor.map(sync, app_names)))
+
+
+def _normalize_job_xml(data: str) -> str:
+    """Canonical form of a job configuration, used to compare jobs.
+
+    Whitespace, the versions Jenkins adds to the plugin attributes and the ID
+    of the branch source are ignored.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    try:
+        root = ET.fromstring(data.encode("utf-8"))
+    except ET.ParseError:
+        return data
+    for element in root.iter():
+        plugin = element.get("plugin")
+        if plugin:
+            element.set("plugin", plugin.split("@")[0])
+    source_id = root.find(SOURCE_ID_PATH)
+    if source_id is not None:
+        source_id.text = None
+    return ET.canonicalize(ET.tostring(root, encoding="unicode"), strip_text=True)
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import threading
+from typing import Dict
+
 from jinja2 import Environment, FileSystemLoader
 
 
 class JinjaTemplate:
-    """Helper class which facilitates in loading in and rendering Jinja2 templates."""
+    """Helper class which facilitates in loading in and rendering Jinja2 templates.
+
+    Use `for_folder` to share the environment, and with it the compiled
+    templates, between every render of the templates in a folder. The
+    templates are compiled again when their file changes.
+    """
+
+    _registry: Dict[str, "JinjaTemplate"] = {}
+    _registry_lock = threading.Lock()
 
     def __init__(self, template_base_folder: str):
         self.env = Environment(
@@ -14,5 +25,20 @@ class JinjaTemplate:
             lstrip_blocks=True,
         )
 
+    @classmethod
+    def for_folder(cls, template_base_folder: str) -> "JinjaTemplate":
+        """Get the shared helper for the templates in a folder.
+
+        Args:
+            template_base_folder: The folder of the templates.
+
+        Returns:
+            The helper for the folder.
+        """
+        with cls._registry_lock:
+            if template_base_folder not in cls._registry:
+                cls._registry[template_base_folder] = cls(template_base_folder)
+            return cls._registry[template_base_folder]
+
     def render_template(self, filename: str, **kwargs) -> str:
         return self.env.get_template(filename).render(**kwargs)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Union
+
+import click
+
+
+class JournalMismatchError(click.ClickException):
+    """A journaled step was completed with a different payload."""
+
+
+class StepJournal:
+    """Keeps track of the completed steps of an upload in a JSON file.
+
+    Every step is identified by the object it created or changed, for example
+    "Deployment/project/app-qas", and is stored together with a hash of the
+    payload that was sent. When resuming, a step which is found in the journal
+    is skipped, so an interrupted upload continues from the first incomplete
+    step instead of failing on objects which already exist.
+
+    The file is rewritten atomically after every completed step.
+
+    Args:
+        path: The path of the journal file.
+        resume: Load the steps of a previous run. If False, the journal starts
+            empty and a previous journal file gets overwritten.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.steps = {}
+        self._lock = threading.Lock()
+        if resume:
+            try:
+                with open(self.path, "r") as f:
+                    self.steps = json.load(f)["steps"]
+            except FileNotFoundError:
+                click.echo(f"No journal found ({self.path}), starting from scratch")
+            except (ValueError, KeyError) as e:
+                raise click.ClickException(
+                    f'Error parsing the journal file ("{self.path}"): {e}'
+                )
+
+    @staticmethod
+    def hash_payload(payload: Union[str, bytes, dict, list]) -> str:
+        """Hash the payload of a step.
+
+        Args:
+            payload: The payload as text, bytes or a JSON serializable object.
+
+        Returns:
+            The SHA-256 hex digest of the payload.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif not isinstance(payload, bytes):
+            payload = json.dumps(payload, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def is_done(self, step: str, payload) -> bool:
+        """Check if a step has already been completed.
+
+        Args:
+            step: The identity of the object of the step.
+            payload: The payload the step is about to send.
+
+        Returns:
+            True if the step is in the journal with the same payload.
+
+        Raises:
+            JournalMismatchError: If the step is in the journal but was completed
+                with a different payload.
+        """
+        with self._lock:
+            entry = self.steps.get(step)
+        if entry is None:
+            return False
+        if entry["hash"] != self.hash_payload(payload):
+            raise JournalMismatchError(
+                f"Step '{step}' was completed with a different payload. "
+                f'Remove the journal ("{self.path}") to start from scratch.'
+            )
+        return True
+
+    def record(self, step: str, payload):
+        """Mark a step as completed and write the journal to disk.
+
+        Args:
+            step: The identity of the object of the step.
+            payload: The payload which was sent.
+        """
+        with self._lock:
+            self.steps[step] = {
+                "hash": self.hash_payload(payload),
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._write()
+
+    def _write(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"steps": self.steps}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import copy
 import json
-from typing import List
+from typing import Iterator, List, Optional
 
 import click
 import requests
 import yaml
 
+from helpers.journal import StepJournal
+from helpers.rate_limiter import AdaptiveRateLimiter
+
+# The collection of every kind of object created per env, relative to the
+# namespace.
+ENV_RESOURCES = {
+    "Service": "/api/v1/namespaces/{project}/services",
+    "Deployment": "/apis/apps/v1/namespaces/{project}/deployments",
+    "ConfigMap": "/api/v1/namespaces/{project}/configmaps",
+    "Secret": "/api/v1/namespaces/{project}/secrets",
+}
+
 
 class OpenShiftAPI:
     """Communicates with OpenShift via the REST API."""
@@ -16,9 +27,60 @@ class OpenShiftAPI:
     def __init__(self, url: str, api_token: str):
         self.url = url
         self.api_token = api_token
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.api_token}"
+        self.limiter = AdaptiveRateLimiter.for_url(url)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request to the API server through the rate limiter.
+
+        Args:
+            method: The HTTP method.
+            path: The path of the resource, relative to the API URL.
+            **kwargs: Passed to `requests.Session.request`.
+
+        Returns:
+            The response.
+        """
+        return self.limiter.send(self.session, method, f"{self.url}{path}", **kwargs)
+
+    def _apply(
+        self,
+        method: str,
+        path: str,
+        payload: dict,
+        step: str,
+        message: str,
+        journal: StepJournal = None,
+        headers: dict = None,
+    ):
+        """Send a write request, unless the journal says it was already done.
+
+        Args:
+            method: The HTTP method.
+            path: The path of the resource, relative to the API URL.
+            payload: The JSON payload.
+            step: The identity of the object, used as key in the journal.
+            message: The message to log when done.
+            journal: The journal of the upload, if any.
+            headers: Extra headers for the request.
+        """
+        if journal is not None and journal.is_done(step, payload):
+            click.echo(f"{message} (skipped, found in journal)")
+            return
+        response = self._request(method, path, headers=headers, json=payload)
+        response.raise_for_status()
+        click.echo(message)
+        if journal is not None:
+            journal.record(step, payload)
 
     def create_process_template(
-        self, project: str, app_name: str, envs: List[str], data: bytes
+        self,
+        project: str,
+        app_name: str,
+        envs: List[str],
+        data: bytes,
+        journal: StepJournal = None,
     ):
         """Create the template and resources in OpenShift.
 
@@ -32,37 +94,39 @@ class OpenShiftAPI:
         in OpenShift:
                 - Service
                 - Deployment
-                - Config map (optional)
-                - Secret (optional)
+                - Config maps (optional, one per shard)
+                - Secrets (optional, one per shard)
 
         For the deployment, an image trigger will be set so that a new deployment
         rolls out automatically when there is an image stream change.
 
+        When a journal is given, every completed step is recorded in it and steps
+        which are already in it are skipped, which allows resuming an upload.
+
         Args:
             project: The project to create the resources in.
             app_name: The name of the application.
             envs: The environments.
             data: The template.
+            journal: The journal of the upload.
         """
-        # Set the auth token
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-
         yaml_object = yaml.safe_load(data)
 
         # Create the template
-        response_template = requests.post(
-            f"{self.url}/apis/template.openshift.io/v1/namespaces/{project}/templates",
-            headers=headers,
-            json=yaml_object,
+        self._apply(
+            "POST",
+            f"/apis/template.openshift.io/v1/namespaces/{project}/templates",
+            yaml_object,
+            f"Template/{project}/{app_name}",
+            f"Template '{project}/{app_name}' created",
+            journal,
         )
-        response_template.raise_for_status()
-        click.echo(f"Template '{project}/{app_name}' created")
         for env in envs:
             # Process the template with the parameters filled in
             yaml_object["parameters"][0]["value"] = env
-            response_processed = requests.post(
-                f"{self.url}/apis/template.openshift.io/v1/namespaces/{project}/processedtemplates",
-                headers=headers,
+            response_processed = self._request(
+                "POST",
+                f"/apis/template.openshift.io/v1/namespaces/{project}/processedtemplates",
                 json=yaml_object,
             )
             response_processed.raise_for_status()
@@ -70,26 +134,27 @@ class OpenShiftAPI:
             # The processed template
             proc_template = response_processed.json()
             # Create the service
-            response_service = requests.post(
-                f"{self.url}/api/v1/namespaces/{project}/services",
-                headers=headers,
-                json=proc_template["objects"][0],
+            self._apply(
+                "POST",
+                f"/api/v1/namespaces/{project}/services",
+                proc_template["objects"][0],
+                f"Service/{project}/{app_name}-{env}",
+                f"Service '{project}/{app_name}-{env}' created",
+                journal,
             )
-            response_service.raise_for_status()
-            click.echo(f"Service '{project}/{app_name}-{env}' created")
 
             # Create the deployment
-            response_deployment = requests.post(
-                f"{self.url}/apis/apps/v1/namespaces/{project}/deployments",
-                headers=headers,
-                json=proc_template["objects"][1],
+            self._apply(
+                "POST",
+                f"/apis/apps/v1/namespaces/{project}/deployments",
+                proc_template["objects"][1],
+                f"Deployment/{project}/{app_name}-{env}",
+                f"Deployment '{project}/{app_name}-{env}' created",
+                journal,
             )
-            response_deployment.raise_for_status()
-            click.echo(f"Deployment '{project}/{app_name}-{env}' created")
 
             # Set the image trigger
-            headers_patch = copy.deepcopy(headers)
-            headers_patch["Content-type"] = "application/strategic-merge-patch+json"
+            headers_patch = {"Content-type": "application/strategic-merge-patch+json"}
 
             trigger = json.dumps(
                 [
@@ -105,35 +170,238 @@ class OpenShiftAPI:
             }
 
             # Patch in the trigger
-            response_trigger = requests.patch(
-                f"{self.url}/apis/apps/v1/namespaces/{project}/deployments/{app_name}-{env}",
+            self._apply(
+                "PATCH",
+                f"/apis/apps/v1/namespaces/{project}/deployments/{app_name}-{env}",
+                trigger_payload,
+                f"ImageTrigger/{project}/{app_name}-{env}",
+                f"Image trigger for '{project}/{app_name}-{env}' created",
+                journal,
                 headers=headers_patch,
-                json=trigger_payload,
             )
-            response_trigger.raise_for_status()
-            click.echo(f"Image trigger for '{project}/{app_name}-{env}' created")
-            # If available, create the config map
-            config_maps = list(
-                filter(lambda x: x["kind"] == "ConfigMap", proc_template["objects"])
+            # If available, create the config maps and secrets. Large ones are
+            # split in several shards.
+            for kind, resource, description in (
+                ("ConfigMap", "configmaps", "Config map"),
+                ("Secret", "secrets", "Secret"),
+            ):
+                for obj in proc_template["objects"]:
+                    if obj["kind"] != kind:
+                        continue
+                    name = obj["metadata"]["name"]
+                    self._apply(
+                        "POST",
+                        f"/api/v1/namespaces/{project}/{resource}",
+                        obj,
+                        f"{kind}/{project}/{name}",
+                        f"{description} '{project}/{name}' created",
+                        journal,
+                    )
+
+    def _get(self, path: str) -> Optional[dict]:
+        """Get a single object.
+
+        Returns:
+            The object or None if it does not exist.
+        """
+        response = self._request("GET", path)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_current_user(self) -> dict:
+        """Get the user the API token belongs to, which fails if it expired."""
+        user = self._get("/apis/user.openshift.io/v1/users/~")
+        if user is None:
+            raise requests.HTTPError("The current user could not be found")
+        return user
+
+    def get_project(self, project: str) -> Optional[dict]:
+        """Get a project, or None if it does not exist or is not accessible."""
+        return self._get(f"/apis/project.openshift.io/v1/projects/{project}")
+
+    def get_deployment(self, project: str, name: str) -> Optional[dict]:
+        """Get a deployment, or None if it does not exist."""
+        return self._get(
+            f"{ENV_RESOURCES['Deployment'].format(project=project)}/{name}"
+        )
+
+    def get_image_stream(self, project: str, name: str) -> Optional[dict]:
+        """Get an image stream, or None if it does not exist."""
+        return self._get(
+            f"/apis/image.openshift.io/v1/namespaces/{project}/imagestreams/{name}"
+        )
+
+    def list_resource_quotas(self, project: str) -> List[dict]:
+        """List the resource quotas of a project."""
+        quotas = self._get(f"/api/v1/namespaces/{project}/resourcequotas")
+        return quotas.get("items", []) if quotas else []
+
+    def promote_image(
+        self, project: str, app_name: str, source_tag: str, target_tag: str
+    ) -> bool:
+        """Point a tag of the image stream of an app to the image of another tag.
+
+        Same as "oc tag <app>:<source> <app>:<target>": the target
+        ImageStreamTag is created, or updated, with a reference to the image
+        the source tag currently points to.
+
+        Args:
+            project: The project of the image stream.
+            app_name: The name of the application, and of its image stream.
+            source_tag: The tag to promote, e.g. the short commit hash.
+            target_tag: The tag to promote to, e.g. the environment.
+
+        Returns:
+            False if the target tag already pointed to the image.
+        """
+        path = f"/apis/image.openshift.io/v1/namespaces/{project}/imagestreamtags"
+        source = self._get(f"{path}/{app_name}:{source_tag}")
+        if source is None:
+            raise requests.HTTPError(
+                f"Image stream tag '{project}/{app_name}:{source_tag}' not found"
             )
-            if config_maps:
-                response_config_map = requests.post(
-                    f"{self.url}/api/v1/namespaces/{project}/configmaps",
-                    headers=headers,
-                    json=config_maps[0],
-                )
-                response_config_map.raise_for_status()
-                click.echo(f"Config map '{project}/{app_name}-{env}' created")
-
-            # If available, create the secret
-            secrets = list(
-                filter(lambda x: x["kind"] == "Secret", proc_template["objects"])
+        image = source["image"]["metadata"]["name"]
+        target = self._get(f"{path}/{app_name}:{target_tag}")
+        if target is not None and target["image"]["metadata"]["name"] == image:
+            return False
+        payload = {
+            "kind": "ImageStreamTag",
+            "apiVersion": "image.openshift.io/v1",
+            "metadata": {"name": f"{app_name}:{target_tag}", "namespace": project},
+            "tag": {
+                "name": target_tag,
+                "from": {"kind": "ImageStreamImage", "name": f"{app_name}@{image}"},
+            },
+        }
+        if target is None:
+            response = self._request("POST", path, json=payload)
+        else:
+            payload["metadata"]["resourceVersion"] = target["metadata"][
+                "resourceVersion"
+            ]
+            response = self._request(
+                "PUT", f"{path}/{app_name}:{target_tag}", json=payload
             )
-            if secrets:
-                response_config_map = requests.post(
-                    f"{self.url}/api/v1/namespaces/{project}/secrets",
-                    headers=headers,
-                    json=secrets[0],
-                )
-                response_config_map.raise_for_status()
-                click.echo(f"Secret '{project}/{app_name}-{env}' created")
+        response.raise_for_status()
+        return True
+
+    def list_deployments(self, project: str, label_selector: str) -> dict:
+        """List the deployments matching the label selector.
+
+        Returns:
+            The deployment list, of which the resource version can be used to
+            start watching.
+        """
+        response = self._request(
+            "GET",
+            ENV_RESOURCES["Deployment"].format(project=project),
+            params={"labelSelector": label_selector},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def watch_deployments(
+        self,
+        project: str,
+        label_selector: str,
+        resource_version: str,
+        timeout: int,
+    ) -> Iterator[dict]:
+        """Watch the changes of the deployments matching the label selector.
+
+        All changes come in over a single connection, which the server closes
+        after `timeout` seconds.
+
+        Args:
+            project: The project of the deployments.
+            label_selector: The label selector of the deployments.
+            resource_version: Only changes after this version are sent.
+            timeout: The duration of the watch in seconds.
+
+        Yields:
+            The watch events, with the "type" and the changed "object".
+        """
+        response = self._request(
+            "GET",
+            ENV_RESOURCES["Deployment"].format(project=project),
+            params={
+                "labelSelector": label_selector,
+                "resourceVersion": resource_version,
+                "watch": "true",
+                "timeoutSeconds": timeout,
+            },
+            stream=True,
+            timeout=timeout + 10,
+        )
+        response.raise_for_status()
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def label_selector(app_name: str, envs: List[str] = None) -> str:
+        """The label selector of the objects of an app.
+
+        Args:
+            app_name: The name of the application.
+            envs: Only select the objects of these environments, if given.
+
+        Returns:
+            The label selector.
+        """
+        selector = f"app={app_name}"
+        if envs:
+            selector += f",env in ({','.join(envs)})"
+        return selector
+
+    def delete_collection(self, project: str, kind: str, label_selector: str):
+        """Delete every object of a kind matching the label selector.
+
+        Uses a single "deletecollection" request. Older API servers do not
+        support that for services, in which case the matching objects are
+        listed and deleted one by one.
+
+        Args:
+            project: The project of the objects.
+            kind: The kind of the objects, one of ENV_RESOURCES.
+            label_selector: The label selector of the objects.
+        """
+        path = ENV_RESOURCES[kind].format(project=project)
+        params = {"labelSelector": label_selector}
+        response = self._request("DELETE", path, params=params)
+        if response.status_code == 405:
+            response = self._request("GET", path, params=params)
+            response.raise_for_status()
+            for item in response.json().get("items", []):
+                self._delete(f"{path}/{item['metadata']['name']}")
+        else:
+            response.raise_for_status()
+        click.echo(f"{kind} objects in '{project}' with '{label_selector}' deleted")
+
+    def delete_template(self, project: str, app_name: str):
+        """Delete the template of an app, if it exists.
+
+        Args:
+            project: The project of the template.
+            app_name: The name of the application.
+        """
+        deleted = self._delete(
+            f"/apis/template.openshift.io/v1/namespaces/{project}/templates/{app_name}"
+        )
+        suffix = "deleted" if deleted else "not found"
+        click.echo(f"Template '{project}/{app_name}' {suffix}")
+
+    def _delete(self, path: str) -> bool:
+        """Delete a single object.
+
+        Returns:
+            False if the object does not exist.
+        """
+        response = self._request("DELETE", path)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
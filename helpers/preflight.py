@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional
+
+import click
+import requests
+import yaml
+
+from helpers.jenkins_api import JenkinsAPI
+from helpers.openshift_api import OpenShiftAPI
+
+# The multipliers of the suffixes of a Kubernetes quantity.
+QUANTITY_SUFFIXES = {
+    "n": 1e-9,
+    "u": 1e-6,
+    "m": 1e-3,
+    "k": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+    "Ki": 2**10,
+    "Mi": 2**20,
+    "Gi": 2**30,
+    "Ti": 2**40,
+    "Pi": 2**50,
+    "Ei": 2**60,
+}
+# The grammar of a Kubernetes quantity: a signed number with a binary or
+# decimal suffix, or a decimal exponent like "1e3".
+QUANTITY_PATTERN = re.compile(
+    r"^([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))"
+    r"(?:([KMGTPE]i|[numkMGTPE])|[eE]([+-]?[0-9]+))?$"
+)
+
+# The resources asked by the deployments, with the keys a resource quota may
+# limit them with.
+QUOTA_RESOURCES = {
+    "requests.cpu": ("requests.cpu", "cpu"),
+    "requests.memory": ("requests.memory", "memory"),
+    "limits.cpu": ("limits.cpu",),
+    "limits.memory": ("limits.memory",),
+}
+
+
+class PreflightError(click.ClickException):
+    """One or more preflight checks failed.
+
+    Args:
+        failures: The failure message per check.
+    """
+
+    def __init__(self, failures: Dict[str, str]):
+        self.failures = failures
+        lines = [f"- {name}: {message}" for name, message in sorted(failures.items())]
+        super().__init__("Preflight checks failed:\n" + "\n".join(lines))
+
+
+class PreflightCache:
+    """Keeps the passed preflight checks for a short while.
+
+    When many apps of the same namespace are uploaded by the same process, the
+    checks they share, like the namespace or the Jenkins folder, only run once
+    per `ttl` seconds. Failed checks are not kept, so a retry after fixing the
+    problem checks again.
+
+    Args:
+        ttl: How long a result is kept, in seconds.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def get_or_run(self, key: Hashable, check: Callable[[], Optional[str]]):
+        """Get the result of a check, running it if it is not cached.
+
+        Args:
+            key: The identity of the check and its arguments.
+            check: Returns None if the check passed, otherwise the reason.
+
+        Returns:
+            The result of the check.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expires = self._results.get(key)
+            if expires is not None and expires > now:
+                return None
+        result = check()
+        if result is None:
+            with self._lock:
+                self._results[key] = time.monotonic() + self.ttl
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+# The cache shared by all uploads of the process. It only lives as long as the
+# process, so it saves requests in 'serve' mode, not across CLI invocations.
+DEFAULT_CACHE = PreflightCache()
+
+
+def parse_quantity(quantity) -> float:
+    """Parse a Kubernetes quantity, e.g. "500m" or "2Gi", into a number.
+
+    Raises:
+        ValueError: The quantity is invalid.
+    """
+    match = QUANTITY_PATTERN.match(str(quantity).strip())
+    if not match:
+        raise ValueError(f"Invalid quantity: {quantity}")
+    number, suffix, exponent = match.groups()
+    if exponent is not None:
+        return float(number) * 10 ** int(exponent)
+    return float(number) * QUANTITY_SUFFIXES.get(suffix, 1)
+
+
+def requested_resources(template_yaml: str, envs: List[str]) -> Dict[str, float]:
+    """The CPU (in cores) and memory (in bytes) the deployments of all envs ask.
+
+    Args:
+        template_yaml: The rendered OpenShift template.
+        envs: The environments which are uploaded.
+
+    Returns:
+        The amount per quota resource, e.g. "requests.cpu".
+    """
+    template = yaml.safe_load(template_yaml)
+    parameters = {p["name"]: p.get("value") for p in template.get("parameters", [])}
+    replicas = sum(
+        int(obj.get("spec", {}).get("replicas", 1))
+        for obj in template.get("objects", [])
+        if obj.get("kind") == "Deployment"
+    )
+    pods = replicas * len(envs)
+    return {
+        "requests.cpu": pods * parse_quantity(f"{parameters['cpu_requested']}m"),
+        "requests.memory": pods * parse_quantity(f"{parameters['memory_requested']}Mi"),
+        "limits.cpu": pods * parse_quantity(f"{parameters['cpu_limit']}m"),
+        "limits.memory": pods * parse_quantity(f"{parameters['memory_limit']}Mi"),
+    }
+
+
+def _describe_error(error: requests.RequestException) -> str:
+    """Describe a failed request, pointing out expired credentials."""
+    response = getattr(error, "response", None)
+    if response is not None and response.status_code in (401, 403):
+        return f"access denied ({response.status_code}), is the token expired?"
+    return str(error)
+
+
+def _check_openshift_token(openshift_api: OpenShiftAPI) -> Optional[str]:
+    openshift_api.get_current_user()
+    return None
+
+
+def _check_namespace(openshift_api: OpenShiftAPI, namespace: str) -> Optional[str]:
+    if openshift_api.get_project(namespace) is None:
+        return f"namespace '{namespace}' not found"
+    return None
+
+
+def _check_image_stream(
+    openshift_api: OpenShiftAPI, namespace: str, app_name: str, envs: List[str]
+) -> Optional[str]:
+    # The image stream of a new app is only created by its first build, so it
+    # is only expected once a deployment of the app exists.
+    if not any(
+        openshift_api.get_deployment(namespace, f"{app_name}-{env}") for env in envs
+    ):
+        return None
+    if openshift_api.get_image_stream(namespace, app_name) is None:
+        return f"image stream '{namespace}/{app_name}' not found"
+    return None
+
+
+def _check_quota(
+    openshift_api: OpenShiftAPI, namespace: str, requested: Dict[str, float]
+) -> Optional[str]:
+    problems = []
+    for quota in openshift_api.list_resource_quotas(namespace):
+        status = quota.get("status", {})
+        hard = status.get("hard") or quota.get("spec", {}).get("hard", {})
+        used = status.get("used", {})
+        for resource, keys in QUOTA_RESOURCES.items():
+            for key in keys:
+                if key not in hard:
+                    continue
+                available = parse_quantity(hard[key]) - parse_quantity(used.get(key, 0))
+                if requested[resource] > available:
+                    problems.append(
+                        f"'{key}' of quota '{quota['metadata']['name']}' has "
+                        f"{available:g} left, {requested[resource]:g} requested"
+                    )
+    return "; ".join(problems) or None
+
+
+def _check_jenkins_folder(jenkins_api: JenkinsAPI, namespace: str) -> Optional[str]:
+    if jenkins_api.get_folder(namespace) is None:
+        return f"Jenkins folder 'job/{namespace}' not found"
+    return None
+
+
+def run_preflight(
+    namespace: str,
+    app_name: str,
+    envs: List[str],
+    template_yaml: str = None,
+    openshift_api: OpenShiftAPI = None,
+    jenkins_api: JenkinsAPI = None,
+    cache: PreflightCache = None,
+    max_workers: int = 8,
+    resume: bool = False,
+):
+    """Check that an upload can succeed before anything is written.
+
+    The checks run concurrently. The OpenShift checks are only done if an API
+    client and a template are given, the Jenkins check if a Jenkins client is
+    given:
+        - The OpenShift token is valid
+        - The namespace exists
+        - The image stream of the app exists, if a deployment of the app
+          exists and the upload is not resumed
+        - The resource quotas allow the requested CPU and memory
+        - The Jenkins folder of the namespace exists
+
+    Args:
+        namespace: The namespace of the app.
+        app_name: The name of the app.
+        envs: The environments which are uploaded.
+        template_yaml: The rendered OpenShift template.
+        openshift_api: The OpenShift client.
+        jenkins_api: The Jenkins client.
+        cache: The cache of the results, the one of the process by default.
+        max_workers: The maximum amount of checks running at the same time.
+        resume: The upload resumes an interrupted one, of which the app may
+            not have been built yet.
+
+    Raises:
+        PreflightError: A check failed.
+    """
+    if cache is None:
+        cache = DEFAULT_CACHE
+    checks = {}
+    if openshift_api is not None and template_yaml:
+        requested = requested_resources(template_yaml, envs)
+        url = openshift_api.url
+        checks["OpenShift token"] = (
+            (url, "token", openshift_api.api_token),
+            lambda: _check_openshift_token(openshift_api),
+        )
+        checks["Namespace"] = (
+            (url, "namespace", namespace),
+            lambda: _check_namespace(openshift_api, namespace),
+        )
+        if not resume:
+            checks["Image stream"] = (
+                (url, "image stream", namespace, app_name, tuple(envs)),
+                lambda: _check_image_stream(openshift_api, namespace, app_name, envs),
+            )
+        checks["Resource quota"] = (
+            (url, "quota", namespace, tuple(sorted(requested.items()))),
+            lambda: _check_quota(openshift_api, namespace, requested),
+        )
+    if jenkins_api is not None:
+        checks["Jenkins folder"] = (
+            (jenkins_api.url, "folder", namespace),
+            lambda: _check_jenkins_folder(jenkins_api, namespace),
+        )
+
+    def run(name: str) -> Optional[str]:
+        key, check = checks[name]
+
+        def guarded():
+            try:
+                return check()
+            except (requests.RequestException, ValueError) as e:
+                return _describe_error(e)
+
+        return cache.get_or_run(key, guarded)
+
+    names = sorted(checks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(names, executor.map(run, names)))
+    failures = {name: result for name, result in results.items() if result}
+    if failures:
+        raise PreflightError(failures)
+    click.echo(f"Preflight checks passed ({len(names)})")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import click
+import requests
+
+from helpers.openshift_api import OpenShiftAPI
+
+ROLLED_OUT = "rolled out"
+UNCHANGED = "unchanged"
+NO_DEPLOYMENT = "promoted, no deployment found"
+
+
+def rollout_status(deployment: dict, initial_generation: int) -> Optional[str]:
+    """The state of the rollout of a deployment, like "oc rollout status".
+
+    Args:
+        deployment: The deployment.
+        initial_generation: The generation of the deployment before promoting,
+            the image trigger has to change it before the rollout starts.
+
+    Returns:
+        None while the rollout is in progress, otherwise ROLLED_OUT or the
+        reason it failed.
+    """
+    metadata = deployment["metadata"]
+    status = deployment.get("status", {})
+    generation = metadata.get("generation", 0)
+    if generation <= initial_generation:
+        return None
+    if status.get("observedGeneration", 0) < generation:
+        return None
+    for condition in status.get("conditions", []):
+        if condition.get("reason") == "ProgressDeadlineExceeded":
+            return "failed: progress deadline exceeded"
+    replicas = deployment.get("spec", {}).get("replicas", 1)
+    updated = status.get("updatedReplicas", 0)
+    if (
+        updated < replicas
+        or status.get("replicas", 0) > updated
+        or status.get("availableReplicas", 0) < updated
+    ):
+        return None
+    return ROLLED_OUT
+
+
+def promote_apps(
+    openshift_api: OpenShiftAPI,
+    namespace: str,
+    env: str,
+    apps: Dict[str, str],
+    max_workers: int = 8,
+    timeout: int = 600,
+    wait: bool = True,
+) -> Dict[str, str]:
+    """Promote the images of many apps to an environment.
+
+    The tags "<app>:<env>" are pointed to the images of "<app>:<tag>"
+    concurrently. The image triggers then roll out the deployments
+    "<app>-<env>", of which the progress is followed over a single watch on
+    all of them.
+
+    Args:
+        openshift_api: The OpenShift client.
+        namespace: The namespace of the apps.
+        env: The environment to promote to.
+        apps: The tag to promote per app name.
+        max_workers: The maximum amount of tags promoted at the same time.
+        timeout: How long to wait for the rollouts, in seconds.
+        wait: Wait for the rollouts.
+
+    Returns:
+        The outcome per app name: ROLLED_OUT, UNCHANGED, NO_DEPLOYMENT,
+        "promoted" when not waiting, or the reason it failed.
+    """
+    selector = f"app in ({','.join(sorted(apps))}),env={env}"
+    # List before promoting, so the watch misses none of the changes.
+    listing = openshift_api.list_deployments(namespace, selector)
+    generations = {
+        item["metadata"]["name"]: item["metadata"].get("generation", 0)
+        for item in listing.get("items", [])
+    }
+
+    def promote(app_name: str) -> str:
+        tag = apps[app_name]
+        try:
+            if not openshift_api.promote_image(namespace, app_name, tag, env):
+                return UNCHANGED
+        except requests.RequestException as e:
+            return f"failed: {e}"
+        click.echo(f"Image '{namespace}/{app_name}:{tag}' promoted to '{env}'")
+        if f"{app_name}-{env}" not in generations:
+            return NO_DEPLOYMENT
+        return "promoted"
+
+    app_names = sorted(apps)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(app_names, executor.map(promote, app_names)))
+    pending = {
+        f"{app_name}-{env}": app_name
+        for app_name, result in results.items()
+        if result == "promoted"
+    }
+    if not wait:
+        return results
+
+    resource_version = listing["metadata"]["resourceVersion"]
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        remaining = max(1, int(deadline - time.monotonic()))
+        for event in openshift_api.watch_deployments(
+            namespace, selector, resource_version, remaining
+        ):
+            if event["type"] == "ERROR":
+                # The resource version expired, continue from a fresh listing.
+                listing = openshift_api.list_deployments(namespace, selector)
+                resource_version = listing["metadata"]["resourceVersion"]
+                deployments = listing.get("items", [])
+            else:
+                deployments = [event["object"]]
+                resource_version = event["object"]["metadata"]["resourceVersion"]
+            for deployment in deployments:
+                name = deployment["metadata"]["name"]
+                if name not in pending:
+                    continue
+                status = rollout_status(deployment, generations[name])
+                if status is not None:
+                    results[pending.pop(name)] = status
+                    click.echo(f"Deployment '{namespace}/{name}' {status}")
+            if not pending or event["type"] == "ERROR":
+                break
+    for app_name in pending.values():
+        results[app_name] = "failed: timed out waiting for the rollout"
+    return results
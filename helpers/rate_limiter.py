@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import click
+import requests
+
+# Status codes which indicate that the server did not process the request and
+# that it is safe to send it again after backing off.
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class AdaptiveRateLimiter:
+    """Client-side concurrency limiter for an API server.
+
+    The amount of requests that may be in flight at the same time is adjusted
+    with AIMD (additive increase, multiplicative decrease). Every fast,
+    successful response raises the limit with roughly one slot per window,
+    while a 429 or a 5xx response halves it. A `Retry-After` header sent by the
+    server pauses all requests going through the limiter until it has passed.
+
+    Use `for_url` to get the limiter shared by all clients of the same server.
+
+    Args:
+        name: The name used in log messages and metrics.
+        initial_limit: The amount of concurrent requests to start with.
+        min_limit: The lower bound of the concurrency limit.
+        max_limit: The upper bound of the concurrency limit.
+        latency_threshold: Responses slower than this (in seconds) do not raise
+            the limit.
+        backoff: The factor the limit is multiplied with when throttled.
+        max_retries: How many times a throttled request is sent again.
+    """
+
+    _registry: Dict[str, "AdaptiveRateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_threshold: float = 2.0,
+        backoff: float = 0.5,
+        max_retries: int = 5,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._counters = {
+            "requests": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "retries": 0,
+        }
+        self._latency_total = 0.0
+
+    @classmethod
+    def for_url(cls, url: str, **kwargs) -> "AdaptiveRateLimiter":
+        """Get the limiter shared by every client talking to the given server.
+
+        Args:
+            url: The base URL of the API server.
+            **kwargs: Passed to the constructor when the limiter is new.
+
+        Returns:
+            The limiter for the server.
+        """
+        with cls._registry_lock:
+            if url not in cls._registry:
+                cls._registry[url] = cls(url, **kwargs)
+            return cls._registry[url]
+
+    @classmethod
+    def all_limiters(cls) -> Dict[str, "AdaptiveRateLimiter"]:
+        """All the limiters created with `for_url`, by URL."""
+        with cls._registry_lock:
+            return dict(cls._registry)
+
+    @property
+    def current_limit(self) -> int:
+        """The amount of requests which are currently allowed in flight."""
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._condition:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.current_limit:
+                    self.in_flight += 1
+                    return
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, status_code: Optional[int], latency: float):
+        """Free the slot of a finished request and adjust the limit.
+
+        Args:
+            status_code: The status code of the response, None if the request
+                failed without one.
+            latency: The duration of the request in seconds.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._counters["requests"] += 1
+            self._latency_total += latency
+            old_limit = self.current_limit
+            if status_code in RETRYABLE_STATUS_CODES:
+                self._counters["throttled"] += 1
+                self._decrease()
+            elif status_code is None or status_code >= 500:
+                self._counters["server_errors"] += 1
+                self._decrease()
+            elif latency <= self.latency_threshold:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            new_limit = self.current_limit
+            self._condition.notify_all()
+        if new_limit < old_limit:
+            click.echo(
+                f"{self.name}: concurrency limit lowered from {old_limit} to {new_limit}"
+            )
+
+    def pause(self, seconds: float):
+        """Hold back every request going through this limiter.
+
+        Args:
+            seconds: For how long no new requests are sent.
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def send(
+        self, session: requests.Session, method: str, url: str, **kwargs
+    ) -> requests.Response:
+        """Send a request once the limiter allows it.
+
+        Throttled requests (429/503) are sent again after waiting for the time
+        asked by the server in the `Retry-After` header, or an exponential
+        backoff when the header is missing.
+
+        Args:
+            session: The session to send the request with.
+            method: The HTTP method.
+            url: The URL.
+            **kwargs: Passed to `session.request`.
+
+        Returns:
+            The last response received.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            start = time.monotonic()
+            status_code = None
+            try:
+                response = session.request(method, url, **kwargs)
+                status_code = response.status_code
+            finally:
+                self.release(status_code, time.monotonic() - start)
+            if status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            delay = self._retry_delay(response, attempt)
+            click.echo(
+                f"{self.name}: {method} {url} returned {status_code}, retrying in {delay:.1f}s"
+            )
+            with self._condition:
+                self._counters["retries"] += 1
+            self.pause(delay)
+            attempt += 1
+
+    def metrics(self) -> dict:
+        """A snapshot of the limiter state and counters."""
+        with self._condition:
+            requests_sent = self._counters["requests"]
+            return {
+                "limit": self.current_limit,
+                "in_flight": self.in_flight,
+                **self._counters,
+                "avg_latency": (
+                    self._latency_total / requests_sent if requests_sent else 0.0
+                ),
+            }
+
+    def _decrease(self):
+        """Multiplicative decrease, at most once per latency window.
+
+        A burst of concurrent requests being throttled at the same time should
+        only halve the limit once.
+        """
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_threshold:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+
+    @staticmethod
+    def _retry_delay(response: requests.Response, attempt: int) -> float:
+        """The seconds to wait before sending a throttled request again."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+        return min(30.0, 0.5 * 2**attempt)
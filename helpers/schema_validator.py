@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, List
+
+import yaml
+from jsonschema.validators import validator_for
+
+# Matches the "${name}" and "${{name}}" parameter references of a template.
+PARAMETER_PATTERN = re.compile(r"\$\{(\{)?([a-zA-Z0-9_]+)\}(?(1)\})")
+
+
+class TemplateValidationError(Exception):
+    """The rendered template contains invalid objects.
+
+    Args:
+        errors: The messages of every error found.
+    """
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+def _schema_path() -> str:
+    return os.path.join(os.getcwd(), "schemas", "openshift.json")
+
+
+@lru_cache(maxsize=None)
+def _load_schemas() -> dict:
+    """Load the bundled schemas once per process."""
+    with open(_schema_path(), "r") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def compiled_validator(kind: str):
+    """Get the validator of an object kind.
+
+    The validators are compiled once and shared by every validation in the
+    process, so validating many templates only pays for it once.
+
+    Args:
+        kind: The kind of the object, e.g. "Deployment".
+
+    Returns:
+        The validator or None if there is no schema for the kind.
+    """
+    schemas = _load_schemas()
+    definition = schemas["kinds"].get(kind)
+    if definition is None:
+        return None
+    schema = {
+        "$schema": schemas["$schema"],
+        "$ref": f"#/definitions/{definition}",
+        "definitions": schemas["definitions"],
+    }
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def process_template(template: dict, env: str) -> List[dict]:
+    """Fill in the parameters of a template, like OpenShift would.
+
+    A "${name}" reference is replaced in the string it appears in, while a
+    "${{name}}" reference which makes up a whole value is replaced by the
+    parsed value of the parameter, e.g. an integer.
+
+    Args:
+        template: The template.
+        env: The value of the "env" parameter.
+
+    Returns:
+        The processed objects.
+    """
+    parameters = {
+        parameter["name"]: str(parameter.get("value", ""))
+        for parameter in template.get("parameters", [])
+    }
+    parameters["env"] = env
+
+    def substitute(value):
+        if isinstance(value, dict):
+            return {substitute(k): substitute(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [substitute(item) for item in value]
+        if not isinstance(value, str):
+            return value
+        match = PARAMETER_PATTERN.fullmatch(value)
+        if match and match.group(1) and match.group(2) in parameters:
+            return yaml.safe_load(parameters[match.group(2)])
+        return PARAMETER_PATTERN.sub(
+            lambda m: parameters.get(m.group(2), m.group(0)), value
+        )
+
+    return substitute(template.get("objects", []))
+
+
+def _format_error(prefix: str, error) -> str:
+    location = "/".join(str(part) for part in error.absolute_path)
+    return f"{prefix}: {location or '<root>'}: {error.message}"
+
+
+def validate_template(template: dict, envs: Iterable[str]) -> List[str]:
+    """Validate a template and its objects, without contacting the API server.
+
+    Args:
+        template: The template as loaded from the YAML.
+        envs: The environments the template will be processed for.
+
+    Returns:
+        The messages of the errors found, empty if the template is valid.
+    """
+    errors = []
+    validator = compiled_validator("Template")
+    for error in validator.iter_errors(template):
+        errors.append(_format_error("Template", error))
+    if errors:
+        return errors
+    for env in envs:
+        for index, obj in enumerate(process_template(template, env)):
+            kind = obj.get("kind")
+            validator = compiled_validator(kind)
+            if validator is None:
+                continue
+            name = obj.get("metadata", {}).get("name", index)
+            for error in validator.iter_errors(obj):
+                errors.append(_format_error(f"{kind} '{name}' ({env})", error))
+    return errors
+
+
+def check_template(data: str, envs: Iterable[str]):
+    """Validate a rendered template.
+
+    Args:
+        data: The template in YAML format.
+        envs: The environments the template will be processed for.
+
+    Raises:
+        TemplateValidationError: If the template is invalid.
+    """
+    try:
+        template = yaml.safe_load(data)
+    except yaml.YAMLError as e:
+        raise TemplateValidationError([f"Template: invalid YAML: {e}"])
+    if not isinstance(template, dict):
+        raise TemplateValidationError(["Template: not a mapping"])
+    errors = validate_template(template, envs)
+    if errors:
+        raise TemplateValidationError(errors)
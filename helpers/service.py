@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+import click
+import requests
+
+from helpers.rate_limiter import AdaptiveRateLimiter
+
+# The amount of latencies kept per endpoint to calculate the percentiles.
+LATENCY_WINDOW = 1000
+
+
+class ServiceError(Exception):
+    """A request could not be handled.
+
+    Args:
+        message: The error message returned to the client.
+        status: The HTTP status code of the response.
+    """
+
+    def __init__(self, message: str, status: int = 400):
+        self.message = message
+        self.status = status
+        super().__init__(message)
+
+
+class RequestMetrics:
+    """Counts the requests and keeps track of the latency per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint: str, status: int, latency: float):
+        """Record a handled request.
+
+        Args:
+            endpoint: The method and path of the request, e.g. "POST /render".
+            status: The HTTP status code of the response.
+            latency: The duration of the request in seconds.
+        """
+        with self._lock:
+            metrics = self._endpoints.setdefault(
+                endpoint,
+                {"requests": 0, "errors": 0, "latencies": deque(maxlen=LATENCY_WINDOW)},
+            )
+            metrics["requests"] += 1
+            if status >= 400:
+                metrics["errors"] += 1
+            metrics["latencies"].append(latency)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """The counters and latency percentiles (in seconds) per endpoint."""
+        with self._lock:
+            result = {}
+            for endpoint, metrics in self._endpoints.items():
+                latencies = sorted(metrics["latencies"])
+                result[endpoint] = {
+                    "requests": metrics["requests"],
+                    "errors": metrics["errors"],
+                    "avg_latency": sum(latencies) / len(latencies),
+                    "p50_latency": _percentile(latencies, 0.50),
+                    "p95_latency": _percentile(latencies, 0.95),
+                    "max_latency": latencies[-1],
+                }
+            return result
+
+
+def _percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class ConceptsService(ThreadingHTTPServer):
+    """HTTP service handling every request in its own thread.
+
+    The routes map a method and path to a handler. A handler receives the JSON
+    payload of the request and returns the JSON serializable response. The
+    process stays alive between requests, so everything a handler caches
+    (templates, API sessions) stays warm.
+
+    "GET /metrics" returns the request counters and latencies per endpoint and
+    the state of the rate limiter per API server, "GET /health" can be used as
+    liveness probe.
+
+    Args:
+        address: The host and port to listen on.
+        routes: The handlers by method and path, e.g. ("POST", "/render").
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, routes: Dict[tuple, Callable[[dict], dict]]):
+        self.routes = dict(routes)
+        self.metrics = RequestMetrics()
+        self.routes[("GET", "/metrics")] = lambda payload: {
+            "endpoints": self.metrics.snapshot(),
+            "apis": {
+                url: limiter.metrics()
+                for url, limiter in AdaptiveRateLimiter.all_limiters().items()
+            },
+        }
+        self.routes[("GET", "/health")] = lambda payload: {"status": "ok"}
+        super().__init__(address, _RequestHandler)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server: ConceptsService
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        start = time.perf_counter()
+        path = self.path.split("?")[0]
+        handler = self.server.routes.get((method, path))
+        try:
+            if handler is None:
+                raise ServiceError(f"No such endpoint: {method} {path}", 404)
+            status, body = 200, handler(self._read_payload())
+        except ServiceError as e:
+            status, body = e.status, {"error": e.message}
+        except click.ClickException as e:
+            status, body = 400, {"error": e.format_message()}
+        except requests.HTTPError as e:
+            status, body = 502, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        data = json.dumps(body, sort_keys=True).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if handler is not None and path != "/metrics":
+            self.server.metrics.record(
+                f"{method} {path}", status, time.perf_counter() - start
+            )
+
+    def _read_payload(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            raise ServiceError(f"Invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise ServiceError("The payload must be a JSON object")
+        return payload
+
+    def log_message(self, format, *args):
+        click.echo(f"{self.address_string()} - {format % args}", err=True)
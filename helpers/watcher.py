@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# See inotify(7).
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_ignored(path: str) -> bool:
+    """Hidden files, backups and swap files of editors are not watched."""
+    name = os.path.basename(path)
+    return name.startswith(".") or name.endswith(("~", ".swp", ".tmp"))
+
+
+class FileWatcher:
+    """Watches files and folders for changes.
+
+    Uses inotify when it is available and falls back to comparing the
+    modification times of the files at an interval. The parent folders of the
+    watched files are watched, rather than the files themselves, so that
+    editors which replace a file when saving it are picked up too.
+
+    Args:
+        files: The files to watch.
+        folders: The folders of which every file is watched.
+        poll_interval: Seconds between two checks when polling.
+        debounce: Seconds to wait for more changes after the first one, so a
+            burst of changes (e.g. a save) is reported at once.
+        use_inotify: Set to False to always poll.
+    """
+
+    def __init__(
+        self,
+        files: Iterable[str] = (),
+        folders: Iterable[str] = (),
+        poll_interval: float = 0.5,
+        debounce: float = 0.1,
+        use_inotify: bool = True,
+    ):
+        self.files = {os.path.abspath(f) for f in files}
+        self.folders = {os.path.abspath(f) for f in folders}
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._fd = None
+        self._watches: Dict[int, str] = {}
+        if use_inotify:
+            self._init_inotify()
+        self._snapshot = {} if self._fd is not None else self._take_snapshot()
+
+    @property
+    def backend(self) -> str:
+        """The mechanism used to detect changes: "inotify" or "polling"."""
+        return "inotify" if self._fd is not None else "polling"
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(
+                ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+            )
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        folders = self.folders | {os.path.dirname(f) for f in self.files}
+        for folder in folders:
+            wd = libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                os.close(fd)
+                self._watches = {}
+                return
+            self._watches[wd] = folder
+        self._fd = fd
+
+    def close(self):
+        """Stop watching."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _is_watched(self, path: str) -> bool:
+        if path in self.files:
+            return True
+        return os.path.dirname(path) in self.folders and not _is_ignored(path)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Block until one or more of the watched files changed.
+
+        Args:
+            timeout: The maximum number of seconds to wait, None to wait forever.
+
+        Returns:
+            The absolute paths of the changed files, empty on a timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return changed
+            changed = self._read_changes(remaining)
+        # Collect the rest of the burst.
+        while True:
+            more = self._read_changes(self.debounce)
+            if not more:
+                return changed
+            changed |= more
+
+    def _read_changes(self, timeout: Optional[float]) -> Set[str]:
+        if self._fd is not None:
+            return self._read_inotify(timeout)
+        return self._poll(timeout)
+
+    def _read_inotify(self, timeout: Optional[float]) -> Set[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            folder = self._watches.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if self._is_watched(path):
+                changed.add(path)
+        return changed
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        paths = set(self.files)
+        for folder in self.folders:
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            paths.update(os.path.join(folder, name) for name in names)
+        snapshot = {}
+        for path in paths:
+            if not self._is_watched(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _poll(self, timeout: Optional[float]) -> Set[str]:
+        interval = (
+            self.poll_interval if timeout is None else min(self.poll_interval, timeout)
+        )
+        time.sleep(interval)
+        snapshot = self._take_snapshot()
+        changed = {
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changed
@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from helpers.bundle import BundleError, read_bundle, write_bundle
+
+CONCEPTS = {
+    "app-template.yml": "kind: Template\n",
+    "Jenkinsfile": "pipeline {}\n",
+}
+
+
+class NonSeekableStream(io.RawIOBase):
+    """Mimics a pipe: writable but not seekable."""
+
+    def __init__(self):
+        self.data = b""
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += bytes(b)
+        return len(b)
+
+
+@pytest.mark.parametrize("bundle_format", ["tar", "zip", "json"])
+def test_write_read_bundle(bundle_format):
+    stream = NonSeekableStream()
+    write_bundle(CONCEPTS, bundle_format, stream)
+    assert read_bundle(io.BytesIO(stream.data)) == CONCEPTS
+
+
+@pytest.mark.parametrize("bundle_format", ["tar", "zip", "json"])
+def test_write_bundle_is_reproducible(bundle_format):
+    first, second = io.BytesIO(), io.BytesIO()
+    write_bundle(CONCEPTS, bundle_format, first)
+    write_bundle(dict(reversed(list(CONCEPTS.items()))), bundle_format, second)
+    assert first.getvalue() == second.getvalue()
+
+
+def test_read_bundle_invalid():
+    with pytest.raises(BundleError):
+        read_bundle(io.BytesIO(b"not a bundle"))
@@ -1,6 +1,14 @@
+import textwrap
+
 import yaml
 
-from helpers.concepts import OpenShiftTemplate
+from helpers.concepts import (
+    JenkinsFile,
+    MakeFile,
+    OpenShiftTemplate,
+    pipeline_source_id,
+    shard_keys,
+)
 
 
 class TestOpenShiftTemplate:
@@ -42,3 +50,97 @@ class TestOpenShiftTemplate:
         assert deployment["spec"]["template"]["spec"]["containers"][0]["envFrom"] == [
             {"secretRef": {"name": "test-${env}"}}
         ]
+
+    def test_render_template_sharded(self):
+        """Config maps and secrets are split when they are too big"""
+        template = OpenShiftTemplate("test")
+        cm_keys = ["key1", "key2", "key3"]
+        template_yaml = yaml.safe_load(
+            template.render_template(
+                cm_keys=cm_keys,
+                secrets=["secret1"],
+                cm_value_sizes={"key1": 900, "key2": 900, "key3": 10},
+                max_shard_bytes=1024,
+            )
+        )
+        config_maps = [o for o in template_yaml["objects"] if o["kind"] == "ConfigMap"]
+        assert [cm["metadata"]["name"] for cm in config_maps] == [
+            "test-${env}",
+            "test-${env}-2",
+        ]
+        assert list(config_maps[0]["data"]) == ["key1"]
+        assert list(config_maps[1]["data"]) == ["key2", "key3"]
+        # Every shard is referenced by the deployment
+        deployment = template_yaml["objects"][1]
+        assert deployment["spec"]["template"]["spec"]["containers"][0]["envFrom"] == [
+            {"configMapRef": {"name": "test-${env}"}},
+            {"configMapRef": {"name": "test-${env}-2"}},
+            {"secretRef": {"name": "test-${env}"}},
+        ]
+
+
+class TestJenkinsFile:
+    @staticmethod
+    def pod_spec(jenkinsfile: str) -> dict:
+        """The spec of the build pod in the Jenkinsfile."""
+        pod_yaml = jenkinsfile.split('yaml """\\\n')[1].split('""".stripIndent()')[0]
+        return yaml.safe_load(textwrap.dedent(pod_yaml))["spec"]
+
+    def test_render_template_defaults(self):
+        jenkinsfile = JenkinsFile("test").render_template(
+            namespace="namespace", base_image="python:3.7", oc_pull_policy="Always"
+        )
+        spec = self.pod_spec(jenkinsfile)
+        assert "volumes" not in spec
+        assert spec["containers"][1]["imagePullPolicy"] == "Always"
+        assert "parallel {" not in jenkinsfile
+
+    def test_render_template_performance_options(self):
+        """Cache volume, parallel stages and pull policy"""
+        jenkinsfile = JenkinsFile("test").render_template(
+            namespace="namespace",
+            base_image="python:3.7",
+            cache_volume="pip-cache",
+            parallel_stages=True,
+            oc_pull_policy="IfNotPresent",
+        )
+        spec = self.pod_spec(jenkinsfile)
+        assert spec["volumes"] == [
+            {"name": "cache", "persistentVolumeClaim": {"claimName": "pip-cache"}}
+        ]
+        assert spec["containers"][0]["volumeMounts"] == [
+            {"name": "cache", "mountPath": "/cache"}
+        ]
+        assert spec["containers"][1]["imagePullPolicy"] == "IfNotPresent"
+        assert "PIP_CACHE_DIR = '/cache/pip'" in jenkinsfile
+        parallel = jenkinsfile.split("parallel {")[1]
+        assert parallel.index("stage('Test code')") < parallel.index(
+            "stage('Build code')"
+        )
+
+
+class TestMakeFile:
+    def test_render_template_test_workers(self):
+        makefile = MakeFile("test").render_template(test_workers=4)
+        assert "\tpython -m pytest -n 4 --junitxml=./tests/test_results.xml" in makefile
+
+    def test_render_template_not_implemented(self):
+        makefile = MakeFile("test").render_template(test_workers=0)
+        assert makefile.endswith("\techo Testing not implemented")
+
+
+def test_shard_keys():
+    sizes = {"a": 50, "b": 50, "c": 200}
+    assert shard_keys(["a", "b", "c"], sizes, max_bytes=128) == [["a", "b"], ["c"]]
+    assert shard_keys(["a", "b", "c"], sizes, max_bytes=1024) == [["a", "b", "c"]]
+    assert shard_keys([], sizes) == []
+
+
+def test_pipeline_source_id():
+    assert pipeline_source_id("ns", "app", True) == pipeline_source_id(
+        "ns", "app", True
+    )
+    assert pipeline_source_id("ns", "app", True) != pipeline_source_id(
+        "ns", "other", True
+    )
+    assert pipeline_source_id("ns", "app") != pipeline_source_id("ns", "app")
@@ -3,6 +3,12 @@ import pytest
 
 from helpers.jenkins_api import JenkinsAPI
 
+SAME_JOB = (
+    '<job plugin="{plugin}"><sources><data><jenkins.branch.BranchSource><source>'
+    "<id>{id}</id><repository>same</repository>"
+    "</source></jenkins.branch.BranchSource></data></sources></job>"
+)
+
 
 @pytest.fixture
 def jenkins_api():
@@ -42,3 +48,92 @@ def test_get_multibranch_pipeline(jenkins_api):
 
     assert responses.calls[0].response.status_code == 200
     assert responses.calls[0].response.text == definition
+
+
+@responses.activate
+def test_delete_multibranch_pipeline(jenkins_api):
+    url = "https://localhost/job/folder/job/appname/doDelete"
+    responses.add(responses.POST, url)
+    jenkins_api.delete_multibranch_pipeline("folder", "appname")
+
+    assert len(responses.calls) == 1
+    assert responses.calls[0].request.method == "POST"
+
+
+@responses.activate
+def test_list_jobs(jenkins_api):
+    url = "https://localhost/job/folder/api/json?tree=jobs%5Bname%5D"
+    responses.add(
+        responses.GET,
+        url,
+        json={"jobs": [{"name": "app1"}, {"name": "app2"}]},
+    )
+    assert jenkins_api.list_jobs("folder") == ["app1", "app2"]
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_sync_folder(jenkins_api):
+    """Only missing and changed jobs are sent"""
+    responses.add(
+        responses.GET,
+        "https://localhost/job/folder/api/json",
+        json={"jobs": [{"name": "same"}, {"name": "changed"}]},
+    )
+    responses.add(
+        responses.GET,
+        "https://localhost/job/folder/job/same/config.xml",
+        body=SAME_JOB.format(plugin="workflow@2.6", id="other").replace("><", ">\n<"),
+    )
+    responses.add(
+        responses.GET,
+        "https://localhost/job/folder/job/changed/config.xml",
+        body="<job><a/></job>",
+    )
+    responses.add(responses.POST, "https://localhost/job/folder/job/changed/config.xml")
+    responses.add(responses.POST, "https://localhost/job/folder/createItem")
+
+    actions = jenkins_api.sync_folder(
+        "folder",
+        {
+            "same": SAME_JOB.format(plugin="workflow", id="uuid"),
+            "changed": "<job><b/></job>",
+            "missing": "<job/>",
+        },
+    )
+
+    assert actions == {"changed": "updated", "missing": "created", "same": "unchanged"}
+    posts = [call.request for call in responses.calls if call.request.method == "POST"]
+    assert sorted(request.url for request in posts) == [
+        "https://localhost/job/folder/createItem?name=missing",
+        "https://localhost/job/folder/job/changed/config.xml",
+    ]
+
+
+@responses.activate
+def test_sync_folder_failed_job(jenkins_api):
+    """A failing job does not stop the others"""
+    responses.add(
+        responses.GET,
+        "https://localhost/job/folder/api/json",
+        json={"jobs": [{"name": "forbidden"}]},
+    )
+    responses.add(
+        responses.GET,
+        "https://localhost/job/folder/job/forbidden/config.xml",
+        body="<html>Forbidden</html>",
+        status=403,
+    )
+    responses.add(responses.POST, "https://localhost/job/folder/createItem")
+
+    actions = jenkins_api.sync_folder(
+        "folder", {"forbidden": "<job/>", "missing": "<job/>"}
+    )
+
+    assert actions["missing"] == "created"
+    assert actions["forbidden"].startswith("failed: 403")
+    assert not any(
+        call.request.url.endswith("forbidden/config.xml")
+        and call.request.method == "POST"
+        for call in responses.calls
+    )
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from helpers.journal import JournalMismatchError, StepJournal
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "app-upload-journal.json")
+
+
+def test_record(journal_path):
+    journal = StepJournal(journal_path)
+    journal.record("Service/project/app-int", {"kind": "Service"})
+
+    with open(journal_path, "r") as f:
+        steps = json.load(f)["steps"]
+    assert steps["Service/project/app-int"]["hash"] == StepJournal.hash_payload(
+        {"kind": "Service"}
+    )
+
+
+def test_is_done_resume(journal_path):
+    StepJournal(journal_path).record("Service/project/app-int", {"kind": "Service"})
+
+    journal = StepJournal(journal_path, resume=True)
+    assert journal.is_done("Service/project/app-int", {"kind": "Service"})
+    assert not journal.is_done("Deployment/project/app-int", {"kind": "Deployment"})
+
+
+def test_is_done_without_resume(journal_path):
+    StepJournal(journal_path).record("Service/project/app-int", {"kind": "Service"})
+
+    journal = StepJournal(journal_path)
+    assert not journal.is_done("Service/project/app-int", {"kind": "Service"})
+
+
+def test_is_done_different_payload(journal_path):
+    StepJournal(journal_path).record("Service/project/app-int", {"kind": "Service"})
+
+    journal = StepJournal(journal_path, resume=True)
+    with pytest.raises(JournalMismatchError):
+        journal.is_done("Service/project/app-int", {"kind": "Service", "spec": {}})
+
+
+def test_resume_missing_journal(journal_path):
+    journal = StepJournal(journal_path, resume=True)
+    assert journal.steps == {}
@@ -4,6 +4,7 @@ import responses
 import pytest
 import yaml
 
+from helpers.journal import StepJournal
 from helpers.openshift_api import OpenShiftAPI
 
 
@@ -45,3 +46,144 @@ def test_create_process_template(open_shift_api):
     open_shift_api.create_process_template("project", "appname", ["tst"], template_data)
 
     assert len(responses.calls) == 7
+
+
+@responses.activate
+def test_create_process_template_resume(open_shift_api, tmp_path):
+    """Steps found in the journal are not sent again"""
+    template_url = (
+        "https://localhost/apis/template.openshift.io/v1/namespaces/project/templates"
+    )
+    processed_template_url = "https://localhost/apis/template.openshift.io/v1/namespaces/project/processedtemplates"
+    service_url = "https://localhost/api/v1/namespaces/project/services"
+    deployments_url = "https://localhost/apis/apps/v1/namespaces/project/deployments"
+    trigger_url = (
+        "https://localhost/apis/apps/v1/namespaces/project/deployments/appname-tst"
+    )
+    config_map_url = "https://localhost/api/v1/namespaces/project/configmaps"
+    secret_url = "https://localhost/api/v1/namespaces/project/secrets"
+
+    template_path = os.path.join(os.getcwd(), "tests", "resources", "template.yml")
+    with open(template_path, "r") as file:
+        template_data = file.read()
+        template_yaml_object: dict = yaml.safe_load(template_data)
+
+    journal_path = str(tmp_path / "appname-upload-journal.json")
+    journal = StepJournal(journal_path)
+    journal.record("Template/project/appname", yaml.safe_load(template_data))
+    journal.record("Service/project/appname-tst", template_yaml_object["objects"][0])
+
+    responses.add(responses.POST, processed_template_url, json=template_yaml_object)
+    responses.add(responses.POST, deployments_url)
+    responses.add(responses.PATCH, trigger_url)
+    responses.add(responses.POST, config_map_url)
+    responses.add(responses.POST, secret_url)
+
+    open_shift_api.create_process_template(
+        "project",
+        "appname",
+        ["tst"],
+        template_data,
+        journal=StepJournal(journal_path, resume=True),
+    )
+
+    called_urls = [call.request.url for call in responses.calls]
+    assert template_url not in called_urls
+    assert service_url not in called_urls
+    assert len(responses.calls) == 5
+    assert "Secret/project/test_secret" in StepJournal(journal_path, True).steps
+
+
+@responses.activate
+def test_create_process_template_shards(open_shift_api):
+    """Every config map and secret shard is created"""
+    processed_template_url = "https://localhost/apis/template.openshift.io/v1/namespaces/project/processedtemplates"
+    config_map_url = "https://localhost/api/v1/namespaces/project/configmaps"
+
+    template_path = os.path.join(os.getcwd(), "tests", "resources", "template.yml")
+    with open(template_path, "r") as file:
+        template_data = file.read()
+        template_yaml_object: dict = yaml.safe_load(template_data)
+    shard = {
+        "kind": "ConfigMap",
+        "apiVersion": "v1",
+        "metadata": {"name": "test_config_map-2"},
+        "data": {"other": "test"},
+    }
+    template_yaml_object["objects"].insert(3, shard)
+
+    responses.add(
+        responses.POST,
+        "https://localhost/apis/template.openshift.io/v1/namespaces/project/templates",
+    )
+    responses.add(responses.POST, processed_template_url, json=template_yaml_object)
+    responses.add(
+        responses.POST, "https://localhost/api/v1/namespaces/project/services"
+    )
+    responses.add(
+        responses.POST, "https://localhost/apis/apps/v1/namespaces/project/deployments"
+    )
+    responses.add(
+        responses.PATCH,
+        "https://localhost/apis/apps/v1/namespaces/project/deployments/appname-tst",
+    )
+    responses.add(responses.POST, config_map_url)
+    responses.add(responses.POST, "https://localhost/api/v1/namespaces/project/secrets")
+
+    open_shift_api.create_process_template("project", "appname", ["tst"], template_data)
+
+    config_map_calls = [
+        call for call in responses.calls if call.request.url == config_map_url
+    ]
+    assert [
+        yaml.safe_load(call.request.body)["metadata"]["name"]
+        for call in config_map_calls
+    ] == ["test_config_map", "test_config_map-2"]
+    assert len(responses.calls) == 8
+
+
+def test_label_selector():
+    assert OpenShiftAPI.label_selector("appname") == "app=appname"
+    assert (
+        OpenShiftAPI.label_selector("appname", ["int", "prd"])
+        == "app=appname,env in (int,prd)"
+    )
+
+
+@responses.activate
+def test_delete_collection(open_shift_api):
+    url = "https://localhost/apis/apps/v1/namespaces/project/deployments"
+    responses.add(responses.DELETE, url)
+
+    open_shift_api.delete_collection("project", "Deployment", "app=appname")
+
+    assert len(responses.calls) == 1
+    assert responses.calls[0].request.url == f"{url}?labelSelector=app%3Dappname"
+
+
+@responses.activate
+def test_delete_collection_not_allowed(open_shift_api):
+    """Fall back to deleting one by one if deletecollection is not supported"""
+    url = "https://localhost/api/v1/namespaces/project/services"
+    responses.add(responses.DELETE, url, status=405)
+    responses.add(
+        responses.GET,
+        url,
+        json={"items": [{"metadata": {"name": "appname-int"}}]},
+    )
+    responses.add(responses.DELETE, f"{url}/appname-int")
+
+    open_shift_api.delete_collection("project", "Service", "app=appname")
+
+    assert len(responses.calls) == 3
+    assert responses.calls[2].request.url == f"{url}/appname-int"
+
+
+@responses.activate
+def test_delete_template_not_found(open_shift_api):
+    url = "https://localhost/apis/template.openshift.io/v1/namespaces/project/templates/appname"
+    responses.add(responses.DELETE, url, status=404)
+
+    open_shift_api.delete_template("project", "appname")
+
+    assert len(responses.calls) == 1
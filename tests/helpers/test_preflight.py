@@ -0,0 +1,234 @@
+import responses
+import pytest
+
+from helpers.concepts import OpenShiftTemplate
+from helpers.jenkins_api import JenkinsAPI
+from helpers.openshift_api import OpenShiftAPI
+from helpers.preflight import (
+    PreflightCache,
+    PreflightError,
+    parse_quantity,
+    requested_resources,
+    run_preflight,
+)
+
+ENVS = ["int", "qas"]
+OPENSHIFT_URL = "https://openshift"
+JENKINS_URL = "https://jenkins"
+
+
+@pytest.fixture
+def template_yaml():
+    return OpenShiftTemplate("appname").render_template(
+        namespace="project",
+        app_type="exec",
+        memory_requested=128,
+        cpu_requested=100,
+        memory_limit=328,
+        cpu_limit=300,
+        env_vars=[],
+        replicas=2,
+        service_port=8080,
+    )
+
+
+def add_responses(quota_used="0"):
+    responses.add(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/user.openshift.io/v1/users/~",
+        json={"metadata": {"name": "user"}},
+    )
+    responses.add(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/project.openshift.io/v1/projects/project",
+        json={"metadata": {"name": "project"}},
+    )
+    responses.add(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/apps/v1/namespaces/project/deployments/appname-int",
+        json={"metadata": {"name": "appname-int"}},
+    )
+    responses.add(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/image.openshift.io/v1/namespaces/project/imagestreams/appname",
+        json={"metadata": {"name": "appname"}},
+    )
+    responses.add(
+        responses.GET,
+        f"{OPENSHIFT_URL}/api/v1/namespaces/project/resourcequotas",
+        json={
+            "items": [
+                {
+                    "metadata": {"name": "compute"},
+                    "status": {
+                        "hard": {"requests.cpu": "1", "limits.memory": "2Gi"},
+                        "used": {"requests.cpu": quota_used},
+                    },
+                }
+            ]
+        },
+    )
+    responses.add(
+        responses.GET,
+        f"{JENKINS_URL}/job/project/api/json",
+        json={"name": "project"},
+    )
+
+
+@pytest.mark.parametrize(
+    "quantity, expected",
+    [
+        ("500m", 0.5),
+        ("2", 2.0),
+        ("128Mi", 128 * 2**20),
+        ("1G", 1e9),
+        ("2P", 2e15),
+        ("1Ei", 2**60),
+        ("1.5Pi", 1.5 * 2**50),
+        ("1e3", 1000.0),
+        ("2E-3", 0.002),
+        ("+.5k", 500.0),
+        (1, 1.0),
+    ],
+)
+def test_parse_quantity(quantity, expected):
+    assert parse_quantity(quantity) == expected
+
+
+@pytest.mark.parametrize("quantity", ["1Xi", "1ki", "1e", "e3", ""])
+def test_parse_quantity_invalid(quantity):
+    with pytest.raises(ValueError):
+        parse_quantity(quantity)
+
+
+def test_requested_resources(template_yaml):
+    requested = requested_resources(template_yaml, ENVS)
+    # 2 replicas in 2 envs
+    assert requested["requests.cpu"] == pytest.approx(0.4)
+    assert requested["limits.memory"] == 4 * 328 * 2**20
+
+
+@responses.activate
+def test_run_preflight(template_yaml):
+    add_responses()
+    cache = PreflightCache()
+    for _ in range(2):
+        run_preflight(
+            "project",
+            "appname",
+            ENVS,
+            template_yaml,
+            OpenShiftAPI(OPENSHIFT_URL, "token"),
+            JenkinsAPI(JENKINS_URL, "user", "token"),
+            cache=cache,
+        )
+
+    # The second run is answered from the cache.
+    assert len(responses.calls) == 6
+
+
+@responses.activate
+def test_run_preflight_failed(template_yaml):
+    add_responses(quota_used="800m")
+    responses.replace(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/user.openshift.io/v1/users/~",
+        status=401,
+    )
+    responses.replace(responses.GET, f"{JENKINS_URL}/job/project/api/json", status=404)
+
+    with pytest.raises(PreflightError) as e:
+        run_preflight(
+            "project",
+            "appname",
+            ENVS,
+            template_yaml,
+            OpenShiftAPI(OPENSHIFT_URL, "token"),
+            JenkinsAPI(JENKINS_URL, "user", "token"),
+            cache=PreflightCache(),
+        )
+
+    assert sorted(e.value.failures) == [
+        "Jenkins folder",
+        "OpenShift token",
+        "Resource quota",
+    ]
+    assert "is the token expired" in e.value.failures["OpenShift token"]
+    assert "'requests.cpu' of quota 'compute'" in e.value.failures["Resource quota"]
+
+
+@responses.activate
+def test_run_preflight_new_app(template_yaml):
+    """The image stream of an app which was never uploaded is not expected"""
+    add_responses()
+    responses.remove(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/apps/v1/namespaces/project/deployments/appname-int",
+    )
+    for env in ENVS:
+        responses.add(
+            responses.GET,
+            f"{OPENSHIFT_URL}/apis/apps/v1/namespaces/project/deployments/appname-{env}",
+            status=404,
+        )
+    responses.replace(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/image.openshift.io/v1/namespaces/project/imagestreams/appname",
+        status=404,
+    )
+
+    run_preflight(
+        "project",
+        "appname",
+        ENVS,
+        template_yaml,
+        OpenShiftAPI(OPENSHIFT_URL, "token"),
+        cache=PreflightCache(),
+    )
+
+
+@responses.activate
+def test_run_preflight_resume(template_yaml):
+    """A resumed upload does not need the image stream of the app yet"""
+    add_responses()
+    responses.replace(
+        responses.GET,
+        f"{OPENSHIFT_URL}/apis/image.openshift.io/v1/namespaces/project/imagestreams/appname",
+        status=404,
+    )
+
+    run_preflight(
+        "project",
+        "appname",
+        ENVS,
+        template_yaml,
+        OpenShiftAPI(OPENSHIFT_URL, "token"),
+        cache=PreflightCache(),
+        resume=True,
+    )
+
+    assert not any("imagestreams" in call.request.url for call in responses.calls)
+
+
+def test_preflight_cache_passed():
+    cache = PreflightCache()
+    checks = []
+    for _ in range(2):
+        assert cache.get_or_run("key", lambda: checks.append(1)) is None
+    assert len(checks) == 1
+
+
+def test_preflight_cache_failed():
+    """Failed checks run again"""
+    cache = PreflightCache()
+    results = iter(["first", "second"])
+    assert cache.get_or_run("key", lambda: next(results)) == "first"
+    assert cache.get_or_run("key", lambda: next(results)) == "second"
+
+
+def test_preflight_cache_expired():
+    cache = PreflightCache(ttl=0)
+    checks = []
+    for _ in range(2):
+        cache.get_or_run("key", lambda: checks.append(1))
+    assert len(checks) == 2
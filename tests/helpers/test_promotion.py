@@ -0,0 +1,126 @@
+import json
+
+import responses
+import pytest
+
+from helpers.openshift_api import OpenShiftAPI
+from helpers.promotion import (
+    NO_DEPLOYMENT,
+    ROLLED_OUT,
+    UNCHANGED,
+    promote_apps,
+    rollout_status,
+)
+
+DEPLOYMENTS_URL = "https://localhost/apis/apps/v1/namespaces/project/deployments"
+TAGS_URL = (
+    "https://localhost/apis/image.openshift.io/v1/namespaces/project/imagestreamtags"
+)
+
+
+@pytest.fixture
+def open_shift_api():
+    return OpenShiftAPI("https://localhost", "token")
+
+
+def deployment(name, generation, observed=None, updated=0, available=0):
+    return {
+        "metadata": {
+            "name": name,
+            "generation": generation,
+            "resourceVersion": str(generation),
+        },
+        "spec": {"replicas": 1},
+        "status": {
+            "observedGeneration": generation if observed is None else observed,
+            "replicas": 1,
+            "updatedReplicas": updated,
+            "availableReplicas": available,
+        },
+    }
+
+
+def add_istag(app_name, tag, image):
+    responses.add(
+        responses.GET,
+        f"{TAGS_URL}/{app_name}:{tag}",
+        json={
+            "metadata": {"name": f"{app_name}:{tag}", "resourceVersion": "1"},
+            "image": {"metadata": {"name": image}},
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "obj, expected",
+    [
+        # The image trigger did not change the deployment yet
+        (deployment("app-prd", 1, updated=1, available=1), None),
+        (deployment("app-prd", 2, observed=1, updated=1, available=1), None),
+        (deployment("app-prd", 2, updated=1, available=0), None),
+        (deployment("app-prd", 2, updated=1, available=1), ROLLED_OUT),
+    ],
+)
+def test_rollout_status(obj, expected):
+    assert rollout_status(obj, 1) == expected
+
+
+@responses.activate
+def test_promote_apps(open_shift_api):
+    responses.add(
+        responses.GET,
+        DEPLOYMENTS_URL,
+        json={
+            "metadata": {"resourceVersion": "10"},
+            "items": [deployment("app1-prd", 1), deployment("app2-prd", 1)],
+        },
+    )
+    # app1 is promoted, app2 already points to the image, app3 has no deployment
+    add_istag("app1", "abc", "sha256:1")
+    add_istag("app1", "prd", "sha256:0")
+    responses.add(responses.PUT, f"{TAGS_URL}/app1:prd")
+    add_istag("app2", "abc", "sha256:2")
+    add_istag("app2", "prd", "sha256:2")
+    add_istag("app3", "def", "sha256:3")
+    responses.add(responses.GET, f"{TAGS_URL}/app3:prd", status=404)
+    responses.add(responses.POST, TAGS_URL)
+    events = [
+        {"type": "MODIFIED", "object": deployment("app1-prd", 2, observed=1)},
+        {
+            "type": "MODIFIED",
+            "object": deployment("app1-prd", 2, updated=1, available=1),
+        },
+    ]
+    responses.add(
+        responses.GET,
+        DEPLOYMENTS_URL,
+        body="\n".join(json.dumps(event) for event in events),
+    )
+
+    results = promote_apps(
+        open_shift_api, "project", "prd", {"app1": "abc", "app2": "abc", "app3": "def"}
+    )
+
+    assert results == {"app1": ROLLED_OUT, "app2": UNCHANGED, "app3": NO_DEPLOYMENT}
+    put = next(call for call in responses.calls if call.request.method == "PUT")
+    assert json.loads(put.request.body)["tag"]["from"] == {
+        "kind": "ImageStreamImage",
+        "name": "app1@sha256:1",
+    }
+    watch = responses.calls[-1].request
+    assert "watch=true" in watch.url
+    assert "resourceVersion=10" in watch.url
+
+
+@responses.activate
+def test_promote_apps_missing_tag(open_shift_api):
+    responses.add(
+        responses.GET,
+        DEPLOYMENTS_URL,
+        json={"metadata": {"resourceVersion": "10"}, "items": []},
+    )
+    responses.add(responses.GET, f"{TAGS_URL}/app1:abc", status=404)
+
+    results = promote_apps(open_shift_api, "project", "prd", {"app1": "abc"})
+
+    assert results["app1"].startswith("failed")
@@ -0,0 +1,82 @@
+import requests
+import responses
+import pytest
+
+from helpers.rate_limiter import AdaptiveRateLimiter
+
+URL = "https://localhost/api/v1/namespaces/project/services"
+
+
+@pytest.fixture
+def limiter():
+    return AdaptiveRateLimiter("https://localhost", initial_limit=8)
+
+
+@responses.activate
+def test_send_retries_after_throttling(limiter):
+    responses.add(responses.POST, URL, status=429, headers={"Retry-After": "0"})
+    responses.add(responses.POST, URL, status=201)
+
+    response = limiter.send(requests.Session(), "POST", URL, json={})
+
+    assert response.status_code == 201
+    assert len(responses.calls) == 2
+    metrics = limiter.metrics()
+    assert metrics["throttled"] == 1
+    assert metrics["retries"] == 1
+    assert metrics["limit"] == 4
+
+
+@responses.activate
+def test_send_gives_up_after_max_retries():
+    limiter = AdaptiveRateLimiter("https://localhost", max_retries=1)
+    responses.add(responses.POST, URL, status=503, headers={"Retry-After": "0"})
+
+    response = limiter.send(requests.Session(), "POST", URL)
+
+    assert response.status_code == 503
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_send_does_not_retry_client_errors(limiter):
+    responses.add(responses.POST, URL, status=409)
+
+    response = limiter.send(requests.Session(), "POST", URL)
+
+    assert response.status_code == 409
+    assert len(responses.calls) == 1
+    assert limiter.metrics()["limit"] == 8
+
+
+def test_release_additive_increase(limiter):
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(200, 0.01)
+    assert limiter.current_limit == 9
+
+
+def test_release_slow_response_holds_limit(limiter):
+    limiter.acquire()
+    limiter.release(200, 10.0)
+    assert limiter.limit == 8
+
+
+def test_release_decreases_once_per_window(limiter):
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(500, 0.01)
+    assert limiter.current_limit == 4
+    assert limiter.metrics()["server_errors"] == 3
+
+
+def test_retry_delay_from_header():
+    response = requests.Response()
+    response.headers["Retry-After"] = "3"
+    assert AdaptiveRateLimiter._retry_delay(response, 0) == 3.0
+
+
+def test_retry_delay_exponential_backoff():
+    response = requests.Response()
+    assert AdaptiveRateLimiter._retry_delay(response, 0) == 0.5
+    assert AdaptiveRateLimiter._retry_delay(response, 2) == 2.0
@@ -0,0 +1,61 @@
+import pytest
+import yaml
+
+from helpers.concepts import OpenShiftTemplate
+from helpers.schema_validator import (
+    TemplateValidationError,
+    check_template,
+    compiled_validator,
+    process_template,
+)
+
+ENVS = ["int", "qas", "prd"]
+
+
+def render_template(**kwargs) -> str:
+    params = dict(
+        namespace="namespace",
+        app_type="web-app",
+        memory_requested=128,
+        cpu_requested=100,
+        memory_limit=328,
+        cpu_limit=300,
+        env_vars=["KEY_1"],
+        cm_keys=["key.1"],
+        secrets=["key-1"],
+        replicas=1,
+        service_port=8080,
+    )
+    params.update(kwargs)
+    return OpenShiftTemplate("test").render_template(**params)
+
+
+def test_check_template_valid():
+    check_template(render_template(), ENVS)
+
+
+@pytest.mark.parametrize(
+    "params, path",
+    [
+        ({"env_vars": ["1KEY"]}, "containers/0/env/0/name"),
+        ({"cm_keys": ["key with spaces"]}, "ConfigMap 'test-int' (int): data"),
+        ({"service_port": 70000}, "spec/ports/0/port"),
+        ({"cpu_limit": "a lot"}, "resources/limits/cpu"),
+    ],
+)
+def test_check_template_invalid(params, path):
+    with pytest.raises(TemplateValidationError) as e:
+        check_template(render_template(**params), ["int"])
+    assert any(path in error for error in e.value.errors)
+
+
+def test_process_template():
+    template = yaml.safe_load(render_template(service_port=8081))
+    service = process_template(template, "qas")[0]
+    assert service["metadata"]["name"] == "test-qas"
+    assert service["spec"]["ports"][0]["port"] == 8081
+
+
+def test_compiled_validator_is_cached():
+    assert compiled_validator("Deployment") is compiled_validator("Deployment")
+    assert compiled_validator("Route") is None
@@ -0,0 +1,53 @@
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from helpers.service import ConceptsService, ServiceError
+
+
+def echo(payload):
+    if "fail" in payload:
+        raise ServiceError("failed")
+    return {"echo": payload}
+
+
+@pytest.fixture
+def service():
+    service = ConceptsService(("127.0.0.1", 0), {("POST", "/echo"): echo})
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{service.server_port}"
+    service.shutdown()
+    service.server_close()
+
+
+def request(url, payload=None):
+    data = None if payload is None else json.dumps(payload).encode()
+    try:
+        with urlopen(url, data=data) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_route(service):
+    assert request(f"{service}/echo", {"a": 1}) == (200, {"echo": {"a": 1}})
+
+
+def test_errors(service):
+    assert request(f"{service}/echo", {"fail": True}) == (400, {"error": "failed"})
+    assert request(f"{service}/unknown", {})[0] == 404
+
+
+def test_metrics(service):
+    request(f"{service}/echo", {})
+    request(f"{service}/echo", {"fail": True})
+    status, metrics = request(f"{service}/metrics")
+    assert status == 200
+    endpoint = metrics["endpoints"]["POST /echo"]
+    assert endpoint["requests"] == 2
+    assert endpoint["errors"] == 1
+    assert endpoint["max_latency"] >= endpoint["p50_latency"] > 0
@@ -0,0 +1,31 @@
+import pytest
+
+from helpers.watcher import FileWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def use_inotify(request):
+    return request.param
+
+
+def test_wait_file_changed(tmp_path, use_inotify):
+    key_file = tmp_path / "secrets.env"
+    key_file.write_text("KEY=value\n")
+    (tmp_path / "other.env").write_text("")
+
+    with FileWatcher(
+        [str(key_file)], poll_interval=0.05, use_inotify=use_inotify
+    ) as watcher:
+        assert watcher.wait(timeout=0.2) == set()
+        (tmp_path / "other.env").write_text("OTHER=value\n")
+        key_file.write_text("KEY=other value\n")
+        assert watcher.wait(timeout=2) == {str(key_file)}
+
+
+def test_wait_folder_changed(tmp_path, use_inotify):
+    with FileWatcher(
+        folders=[str(tmp_path)], poll_interval=0.05, use_inotify=use_inotify
+    ) as watcher:
+        (tmp_path / ".Jenkinsfile.swp").write_text("")
+        (tmp_path / "Jenkinsfile").write_text("pipeline {}\n")
+        assert watcher.wait(timeout=2) == {str(tmp_path / "Jenkinsfile")}
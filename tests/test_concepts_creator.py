@@ -1,11 +1,28 @@
+import json
 import os
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from uuid import UUID
 
+import pytest
 from click.testing import CliRunner
 
-from concepts_creator import create, upload
+from concepts_creator import (
+    _pooled_jenkins_api,
+    _pooled_openshift_api,
+    _service_params,
+    _service_routes,
+    _watch,
+    create,
+    delete,
+    promote,
+    sync_jenkins,
+    upload,
+)
+from helpers.concepts import OpenShiftTemplate
+from helpers.openshift_api import OpenShiftAPI
+from helpers.service import ServiceError
 
+GOLDEN_FOLDER = os.path.join(os.getcwd(), "tests", "resources", "golden")
 
 NAMESPACE = "namespace"
 APP_NAME = "test"
@@ -63,6 +80,9 @@ def test_create(
             env_vars=[],
             cm_keys=[],
             secrets=[],
+            cm_value_sizes={},
+            secret_value_sizes={},
+            max_shard_bytes=512 * 1024,
             replicas=0,
             service_port=8080,
         )
@@ -70,13 +90,23 @@ def test_create(
     # Jenkinsfile
     jenkins_file.assert_called_once_with(APP_NAME, "./.openshift")
     jenkins_file().create_concept.assert_called_once_with(
-        **dict(namespace=NAMESPACE, base_image="python:3.7")
+        **dict(
+            namespace=NAMESPACE,
+            base_image="python:3.7",
+            promote_command=None,
+            cache_volume=None,
+            parallel_stages=False,
+            oc_pull_policy="Always",
+        )
     )
     # Makefile
     make_file.assert_called_once_with(APP_NAME, "./.openshift")
-    make_file().create_concept.assert_called_once()
+    make_file().create_concept.assert_called_once_with(test_workers=0)
 
 
+@patch("concepts_creator.run_preflight")
+@patch("concepts_creator.check_template")
+@patch("concepts_creator.StepJournal")
 @patch("concepts_creator.JenkinsAPI")
 @patch("concepts_creator.OpenShiftAPI")
 @patch("concepts_creator.OpenShiftTemplate")
@@ -92,7 +122,13 @@ def test_create(
     },
 )
 def test_upload(
-    jenkins_multibranch_pipeline, open_shift_template, open_shift_api, jenkins_api
+    jenkins_multibranch_pipeline,
+    open_shift_template,
+    open_shift_api,
+    jenkins_api,
+    step_journal,
+    check_template,
+    run_preflight,
 ):
     runner = CliRunner()
     result = runner.invoke(
@@ -101,15 +137,32 @@ def test_upload(
     )
     assert result.exit_code == 0
 
+    # Journal
+    step_journal.assert_called_once_with("./test-upload-journal.json", False)
+
     # OpenShift
     open_shift_template.assert_called_once_with(APP_NAME, ".")
     open_shift_template().load_rendered_concept.assert_called_once()
     open_shift_api.assert_called_once_with("OPENSHIFT_API_URL", "OPENSHIFT_API_TOKEN")
+    check_template.assert_called_once_with(
+        open_shift_template().load_rendered_concept.return_value,
+        ("int", "qas", "prd"),
+    )
+    run_preflight.assert_called_once_with(
+        NAMESPACE,
+        APP_NAME,
+        ("int", "qas", "prd"),
+        open_shift_template().load_rendered_concept.return_value,
+        openshift_api=open_shift_api.return_value,
+        jenkins_api=jenkins_api.return_value,
+        resume=False,
+    )
     open_shift_api().create_process_template.assert_called_once_with(
         NAMESPACE,
         APP_NAME,
         ("int", "qas", "prd"),
         open_shift_template().load_rendered_concept.return_value,
+        journal=step_journal.return_value,
     )
 
     # Jenkins
@@ -122,4 +175,422 @@ def test_upload(
         NAMESPACE,
         APP_NAME,
         jenkins_multibranch_pipeline().load_rendered_concept.return_value,
+        journal=step_journal.return_value,
+    )
+
+
+@patch("concepts_creator.write_bundle")
+def test_create_bundle(write_bundle, tmp_path):
+    """Render all concepts to stdout without writing files"""
+    runner = CliRunner()
+    result = runner.invoke(
+        create,
+        PARAMS_MANDATORY_CREATE
+        + ["--output-format", "json", "--output-folder", str(tmp_path)],
+    )
+    assert result.exit_code == 0
+    assert not os.listdir(tmp_path)
+
+    concepts, bundle_format, _ = write_bundle.call_args.args
+    assert bundle_format == "json"
+    assert sorted(concepts) == [
+        "Jenkinsfile",
+        "Makefile",
+        "test-multibranch-pipeline.xml",
+        "test-template.yml",
+    ]
+
+
+@pytest.mark.parametrize("option", ["--upload", "--resume"])
+def test_create_bundle_upload(option):
+    runner = CliRunner()
+    result = runner.invoke(
+        create, PARAMS_MANDATORY_CREATE + ["--output-format", "tar", option]
+    )
+    assert result.exit_code == 2
+
+
+@patch("concepts_creator.run_preflight")
+@patch("concepts_creator.check_template")
+@patch("concepts_creator.StepJournal")
+@patch("concepts_creator.JenkinsAPI")
+@patch("concepts_creator.OpenShiftAPI")
+def test_upload_bundle(
+    open_shift_api, jenkins_api, step_journal, check_template, run_preflight
+):
+    """Upload the concepts of a bundle read from stdin"""
+    bundle = {
+        "concepts": {
+            "test-template.yml": "template",
+            "test-multibranch-pipeline.xml": "<xml/>",
+        }
+    }
+    runner = CliRunner()
+    result = runner.invoke(
+        upload, [NAMESPACE, APP_NAME, "-"], input=json.dumps(bundle).encode()
     )
+    assert result.exit_code == 0
+    assert step_journal.call_count == 0
+    open_shift_api().create_process_template.assert_called_once_with(
+        NAMESPACE, APP_NAME, ("int", "qas", "prd"), "template", journal=None
+    )
+    jenkins_api().create_multibranch_pipeline.assert_called_once_with(
+        NAMESPACE, APP_NAME, "<xml/>", journal=None
+    )
+
+
+@patch("concepts_creator.OpenShiftAPI")
+def test_upload_invalid_template(open_shift_api, tmp_path):
+    """Nothing is uploaded when the template is invalid"""
+    (tmp_path / "test-template.yml").write_text(
+        "apiVersion: template.openshift.io/v1\nkind: Template\nobjects: []\n"
+    )
+    runner = CliRunner()
+    result = runner.invoke(upload, [NAMESPACE, APP_NAME, str(tmp_path)])
+    assert result.exit_code == 1
+    assert "The OpenShift template is invalid" in result.output
+    assert open_shift_api.call_count == 0
+
+
+@patch("concepts_creator.JenkinsAPI")
+@patch("concepts_creator.OpenShiftAPI")
+def test_upload_preflight_failed(open_shift_api, jenkins_api, tmp_path):
+    """Nothing is uploaded when a preflight check fails"""
+    template = OpenShiftTemplate(APP_NAME).render_template(
+        namespace=NAMESPACE,
+        app_type="exec",
+        memory_requested=128,
+        cpu_requested=100,
+        memory_limit=328,
+        cpu_limit=300,
+        env_vars=[],
+        replicas=1,
+        service_port=8080,
+    )
+    (tmp_path / "test-template.yml").write_text(template)
+    open_shift_api().url = "https://openshift-preflight"
+    open_shift_api().get_project.return_value = None
+    open_shift_api().list_resource_quotas.return_value = []
+
+    runner = CliRunner()
+    result = runner.invoke(upload, [NAMESPACE, APP_NAME, str(tmp_path)])
+    assert result.exit_code == 1
+    assert f"namespace '{NAMESPACE}' not found" in result.output
+    assert open_shift_api().create_process_template.call_count == 0
+
+
+@patch("concepts_creator.JenkinsAPI")
+def test_sync_jenkins(jenkins_api, tmp_path):
+    """Sync the rendered multibranch pipelines found in the folders"""
+    (tmp_path / "app1-multibranch-pipeline.xml").write_text("<app1/>")
+    (tmp_path / "app1-template.yml").write_text("template")
+    other_folder = tmp_path / "other"
+    other_folder.mkdir()
+    (other_folder / "app2-multibranch-pipeline.xml").write_text("<app2/>")
+    jenkins_api().sync_folder.return_value = {"app1": "created", "app2": "unchanged"}
+
+    runner = CliRunner()
+    result = runner.invoke(sync_jenkins, [NAMESPACE, str(tmp_path), str(other_folder)])
+    assert result.exit_code == 0
+    jenkins_api().sync_folder.assert_called_once_with(
+        NAMESPACE, {"app1": "<app1/>", "app2": "<app2/>"}, 8
+    )
+    assert f"Jenkins job '{NAMESPACE}/app1' created" in result.output
+
+
+@patch("concepts_creator.JenkinsAPI")
+@patch("concepts_creator.OpenShiftAPI")
+def test_delete(open_shift_api, jenkins_api):
+    """Delete every kind by label, the template and the job of an app"""
+    open_shift_api.label_selector = OpenShiftAPI.label_selector
+
+    runner = CliRunner()
+    result = runner.invoke(delete, [NAMESPACE, APP_NAME, "--yes"])
+    assert result.exit_code == 0
+    assert open_shift_api().delete_collection.call_count == 4
+    open_shift_api().delete_collection.assert_any_call(
+        NAMESPACE, "Deployment", f"app={APP_NAME}"
+    )
+    open_shift_api().delete_template.assert_called_once_with(NAMESPACE, APP_NAME)
+    jenkins_api().delete_multibranch_pipeline.assert_called_once_with(
+        NAMESPACE, APP_NAME
+    )
+
+
+@patch("concepts_creator.JenkinsAPI")
+@patch("concepts_creator.OpenShiftAPI")
+def test_delete_manifest(open_shift_api, jenkins_api, tmp_path):
+    """Only the objects of the given envs are deleted, the template is kept"""
+    open_shift_api.label_selector = OpenShiftAPI.label_selector
+    manifest = tmp_path / "manifest.yml"
+    manifest.write_text(
+        "- namespace: ns1\n  app_name: app1\n"
+        "- namespace: ns2\n  app_name: app2\n  envs: [int, qas]\n"
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(delete, ["--manifest", str(manifest), "--yes"])
+    assert result.exit_code == 0
+    assert open_shift_api().delete_collection.call_count == 8
+    open_shift_api().delete_collection.assert_any_call(
+        "ns2", "Secret", "app=app2,env in (int,qas)"
+    )
+    open_shift_api().delete_template.assert_called_once_with("ns1", "app1")
+    jenkins_api().delete_multibranch_pipeline.assert_called_once_with("ns1", "app1")
+
+
+def test_delete_manifest_invalid(tmp_path):
+    manifest = tmp_path / "manifest.yml"
+    manifest.write_text("- namespace: ns1\n")
+
+    runner = CliRunner()
+    result = runner.invoke(delete, ["--manifest", str(manifest), "--yes"])
+    assert result.exit_code == 1
+    assert "'namespace' and 'app_name' expected" in result.output
+
+
+@patch("concepts_creator.promote_apps")
+@patch("concepts_creator.OpenShiftAPI")
+def test_promote(open_shift_api, promote_apps):
+    promote_apps.return_value = {"app1": "rolled out", "app2": "failed: timed out"}
+
+    runner = CliRunner()
+    result = runner.invoke(promote, [NAMESPACE, "prd", "app1:abc", "app2:def"])
+    assert result.exit_code == 1
+    assert "1 of 2 promotions failed" in result.output
+    promote_apps.assert_called_once_with(
+        open_shift_api(),
+        NAMESPACE,
+        "prd",
+        {"app1": "abc", "app2": "def"},
+        max_workers=8,
+        timeout=600,
+        wait=True,
+    )
+
+
+def test_promote_invalid_app():
+    runner = CliRunner()
+    result = runner.invoke(promote, [NAMESPACE, "prd", "app1"])
+    assert result.exit_code == 2
+
+
+@patch("concepts_creator.JenkinsAPI")
+def test_sync_jenkins_failed(jenkins_api, tmp_path):
+    (tmp_path / "app1-multibranch-pipeline.xml").write_text("<app1/>")
+    (tmp_path / "app2-multibranch-pipeline.xml").write_text("<app2/>")
+    jenkins_api().sync_folder.return_value = {
+        "app1": "created",
+        "app2": "failed: 500 Server Error",
+    }
+
+    runner = CliRunner()
+    result = runner.invoke(sync_jenkins, [NAMESPACE, str(tmp_path)])
+    assert result.exit_code == 1
+    assert f"Jenkins job '{NAMESPACE}/app1' created" in result.output
+    assert "1 of 2 jobs failed to sync" in result.output
+
+
+def test_sync_jenkins_nothing_rendered(tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(sync_jenkins, [NAMESPACE, str(tmp_path)])
+    assert result.exit_code == 1
+
+
+def test_create_watch_upload():
+    runner = CliRunner()
+    result = runner.invoke(create, PARAMS_MANDATORY_CREATE + ["--watch", "--upload"])
+    assert result.exit_code == 2
+
+
+@patch("concepts_creator.FileWatcher")
+def test_watch(file_watcher, tmp_path):
+    """Only the concepts depending on the changed file are rendered again"""
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    key_file = str(tmp_path / "secrets.env")
+    concepts = []
+    for name in ("template.yml", "Jenkinsfile", "Makefile"):
+        concept = MagicMock()
+        concept.template_filename.return_value = str(templates / name)
+        concepts.append((concept, MagicMock()))
+    watcher = file_watcher.return_value.__enter__.return_value
+    watcher.wait.side_effect = [
+        {key_file},
+        {str(templates / "Makefile")},
+        KeyboardInterrupt,
+    ]
+
+    _watch(concepts, [key_file])
+
+    file_watcher.assert_called_once_with({key_file}, {str(templates)})
+    assert [render.call_count for _, render in concepts] == [1, 0, 1]
+
+
+def test_service_render():
+    """Render the concepts in memory with the defaults of create"""
+    render = _service_routes({})[("POST", "/render")]
+    response = render(
+        {"namespace": NAMESPACE, "app_name": APP_NAME, "secrets_file": "KEY=value\n"}
+    )
+    concepts = response["concepts"]
+    assert sorted(concepts) == [
+        "Jenkinsfile",
+        "Makefile",
+        "test-multibranch-pipeline.xml",
+        "test-template.yml",
+    ]
+    assert "KEY: ''" in concepts["test-template.yml"]
+    # The image is promoted with 'oc tag' unless a promote command is given
+    assert "oc tag $APP_NAME" in concepts["Jenkinsfile"]
+    assert "None" not in concepts["Jenkinsfile"]
+
+
+def test_service_params_optional():
+    """Options without a default stay None unless they are given"""
+    params = _service_params({"namespace": NAMESPACE, "app_name": APP_NAME})
+    assert params["promote_command"] is None
+    assert params["cache_volume"] is None
+    assert params["envs"] == ("int", "qas", "prd")
+    params = _service_params(
+        {"namespace": NAMESPACE, "app_name": APP_NAME, "cache_volume": "cache"}
+    )
+    assert params["cache_volume"] == "cache"
+
+
+def test_service_render_same_as_create(tmp_path):
+    """The defaults of the service render the same Jenkinsfile as create"""
+    runner = CliRunner()
+    result = runner.invoke(
+        create, PARAMS_MANDATORY_CREATE + ["--output-folder", str(tmp_path)]
+    )
+    assert result.exit_code == 0
+    with open(tmp_path / ".openshift" / "Jenkinsfile") as f:
+        jenkinsfile = f.read()
+
+    render = _service_routes({})[("POST", "/render")]
+    concepts = render({"namespace": NAMESPACE, "app_name": APP_NAME})["concepts"]
+    assert concepts["Jenkinsfile"] == jenkinsfile
+    assert "volumes:" not in jenkinsfile
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"namespace": NAMESPACE},
+        {"namespace": NAMESPACE, "app_name": APP_NAME, "envs": ["dev"]},
+        {"namespace": NAMESPACE, "app_name": APP_NAME, "replicas": "many"},
+    ],
+)
+def test_service_render_invalid(payload):
+    render = _service_routes({})[("POST", "/render")]
+    with pytest.raises(ServiceError):
+        render(payload)
+
+
+def test_service_create_workspace(tmp_path):
+    """The output folder is resolved under the workspace"""
+    create_handler = _service_routes({}, str(tmp_path))[("POST", "/create")]
+    response = create_handler(
+        {"namespace": NAMESPACE, "app_name": APP_NAME, "output_folder": "app"}
+    )
+    assert response["output_folder"] == str(tmp_path / "app" / ".openshift")
+    assert (tmp_path / "app" / ".openshift" / "test-template.yml").exists()
+
+
+@pytest.mark.parametrize("output_folder", ["../outside", "/tmp", 42])
+def test_service_output_folder_outside_workspace(tmp_path, output_folder):
+    routes = _service_routes({}, str(tmp_path / "workspace"))
+    for endpoint in ("/create", "/upload"):
+        with pytest.raises(ServiceError) as e:
+            routes[("POST", endpoint)](
+                {
+                    "namespace": NAMESPACE,
+                    "app_name": APP_NAME,
+                    "output_folder": output_folder,
+                }
+            )
+        assert e.value.status == 400
+    assert not (tmp_path / "outside").exists()
+
+
+@patch("concepts_creator.JenkinsAPI")
+@patch("concepts_creator.OpenShiftAPI")
+def test_service_upload_pooled(open_shift_api, jenkins_api):
+    """The API clients are reused between requests"""
+    _pooled_openshift_api.cache_clear()
+    _pooled_jenkins_api.cache_clear()
+    credentials = dict(
+        openshift_api_url="https://openshift",
+        openshift_api_token="token",
+        jenkins_api_url="https://jenkins",
+        jenkins_api_user="user",
+        jenkins_api_token="token",
+    )
+    upload_handler = _service_routes(credentials)[("POST", "/upload")]
+    payload = {
+        "namespace": NAMESPACE,
+        "app_name": APP_NAME,
+        "validate": False,
+        "preflight": False,
+        "concepts": {
+            "test-template.yml": "template",
+            "test-multibranch-pipeline.xml": "<xml/>",
+        },
+    }
+    upload_handler(payload)
+    upload_handler(payload)
+
+    open_shift_api.assert_called_once_with("https://openshift", "token")
+    assert open_shift_api().create_process_template.call_count == 2
+    jenkins_api().create_multibranch_pipeline.assert_called_with(
+        NAMESPACE, APP_NAME, "<xml/>", journal=None
+    )
+
+
+def render_golden(output_folder):
+    """Render the golden app in deterministic mode."""
+    input_folder = os.path.join(GOLDEN_FOLDER, "input")
+    runner = CliRunner()
+    result = runner.invoke(
+        create,
+        [
+            NAMESPACE,
+            "golden-app",
+            "--deterministic",
+            "--app-type",
+            "web-app",
+            "--env-file",
+            os.path.join(input_folder, "env.env"),
+            "--config-map-file",
+            os.path.join(input_folder, "config-map.env"),
+            "--secrets-file",
+            os.path.join(input_folder, "secrets.env"),
+            "--output-folder",
+            str(output_folder),
+        ],
+    )
+    assert result.exit_code == 0
+    openshift_folder = os.path.join(output_folder, ".openshift")
+    rendered = {}
+    for basename in sorted(os.listdir(openshift_folder)):
+        with open(os.path.join(openshift_folder, basename), "rb") as f:
+            rendered[basename] = f.read()
+    return rendered
+
+
+def test_create_deterministic_golden(tmp_path):
+    """Identical inputs render byte-identical concepts, equal to the golden files.
+
+    After an intended change of the templates, render the golden app again
+    with the same options into tests/resources/golden/expected.
+    """
+    first = render_golden(tmp_path / "first")
+    second = render_golden(tmp_path / "second")
+    assert first == second
+
+    expected_folder = os.path.join(GOLDEN_FOLDER, "expected")
+    assert sorted(first) == sorted(os.listdir(expected_folder))
+    for basename, rendered in first.items():
+        with open(os.path.join(expected_folder, basename), "rb") as f:
+            assert rendered == f.read(), f"{basename} differs from the golden file"